@@ -0,0 +1,87 @@
+#!/usr/bin/env python
+"""
+hnt 启动时间测试，比 typer 自身的导入时间慢超过阈值或启动时导入了重量级模块时返回 1
+
+    python benchmarks/bench_startup.py [--repeat 20] [--max-extra-ms 100]
+"""
+# Standard library imports
+import argparse
+import statistics
+import subprocess
+import sys
+import time
+
+# Third-party imports
+
+# Application-specific imports
+
+commands = [
+    ["--version"],
+    ["--help"],
+    ["thirdorder", "--help"],
+]
+# 只有具体的子命令才应该导入这些模块
+heavy_modules = ["matplotlib", "pandas", "scipy", "numpy", "toml", "hanetoolpy.functions"]
+
+
+def time_command(args, repeat):
+    """
+    返回 repeat 次运行的耗时 (ms)，先运行一次以生成 __pycache__
+    """
+    subprocess.run(args, stdout=subprocess.DEVNULL, check=True)
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run(args, stdout=subprocess.DEVNULL, check=True)
+        times.append((time.perf_counter() - start) * 1000)
+    return times
+
+
+def get_startup_modules():
+    """
+    导入命令行入口后已加载的重量级模块
+    """
+    code = ("import sys, hanetoolpy.typer.main\n"
+            f"print(' '.join(m for m in {heavy_modules!r} if m in sys.modules))")
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+    return result.stdout.split()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--max-extra-ms", type=float, default=100.0,
+                        help="threshold of the median time of `hnt --version` "
+                             "minus that of `python -c \"import typer\"`")
+    args = parser.parse_args()
+
+    hnt = [sys.executable, "-m", "hanetoolpy.typer.main"]
+    baseline = statistics.median(time_command([sys.executable, "-c", "import typer"], args.repeat))
+    label = 'python -c "import typer"'
+    print(f"{label:<28} median {baseline:7.1f} ms")
+    results = dict()
+    for command in commands:
+        times = time_command(hnt + command, args.repeat)
+        results[" ".join(command)] = statistics.median(times)
+        print(f"{'hnt ' + ' '.join(command):<28} median {statistics.median(times):7.1f} ms"
+              f"  min {min(times):7.1f} ms")
+
+    failed = False
+    modules = get_startup_modules()
+    if modules:
+        print(f"FAIL: imported at startup: {', '.join(modules)}")
+        failed = True
+    # 以同一次运行中 typer 的导入时间为基准，不受机器和磁盘速度的影响
+    extra = results["--version"] - baseline
+    print(f"hnt --version - import typer: {extra:.1f} ms")
+    if extra > args.max_extra_ms:
+        print(f"FAIL: hnt --version {results['--version']:.1f} ms > import typer {baseline:.1f} ms "
+              f"+ {args.max_extra_ms:g} ms")
+        failed = True
+    if not failed:
+        print("OK")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
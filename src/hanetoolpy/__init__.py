@@ -1 +1,6 @@
-from .about import __version__
\ No newline at end of file
+def __getattr__(name):
+    # 延迟读取版本号，见 hanetoolpy.about
+    if name == "__version__":
+        from .about import get_version
+        return get_version()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
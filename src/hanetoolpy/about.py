@@ -1,19 +1,32 @@
-try:
-    from importlib import metadata
-except ImportError:  # for Python<3.8
-    import importlib_metadata as metadata
+from functools import lru_cache
 
 program_name = "hanetoolpy"
 build_date = "2023.11.16"
+build_text = f"build {build_date}"
 
-try:
-    __version__ = metadata.version("hanetoolpy")
-except metadata.PackageNotFoundError:
-    __version__ = build_date
 
-version_text = f"version {__version__}"
-build_text = f"build {build_date}"
-full_version = f"{program_name} | {version_text} ({build_text})"
+@lru_cache(maxsize=None)
+def get_version():
+    # importlib.metadata 导入和查找都较慢，只在需要版本号时读取
+    try:
+        from importlib import metadata
+    except ImportError:  # for Python<3.8
+        import importlib_metadata as metadata
+    try:
+        return metadata.version("hanetoolpy")
+    except metadata.PackageNotFoundError:
+        return build_date
+
+
+def __getattr__(name):
+    if name == "__version__":
+        return get_version()
+    elif name == "version_text":
+        return f"version {get_version()}"
+    elif name == "full_version":
+        return f"{program_name} | version {get_version()} ({build_text})"
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 
 from pathlib import Path
 current_file_path = Path(__file__).resolve()
@@ -10,17 +10,7 @@ from matplotlib.ticker import MultipleLocator
 from typing_extensions import Annotated
 
 from hanetoolpy.utils.check_files import check_files
-
-# 修改字体
-import matplotlib.font_manager as fm
-available_fonts = fm.findSystemFonts()
-font_name = 'Times New Roman'
-if font_name in available_fonts:
-    plt.rcParams["font.family"] = font_name
-# plt.rcParams['axes.unicode_minus'] = True
-config = {"font.size": 8,
-          "mathtext.fontset": 'cm'}
-plt.rcParams.update(config)
+from hanetoolpy.utils.plot_style import apply_style
 
 
 def read_pband_elements(root_dir=None, path: str = "./PBAND_ELEMENTS.dat"):
@@ -162,6 +152,8 @@ def main(cbar: Annotated[bool, typer.Option(help="Whether to draw the colorbar")
                    "EBS.dat",
                    "BAND.dat"]
     check_files(input_files)
+    # 修改字体和字号
+    apply_style(font_size=8)
     # 建立画布
     if cbar:
         import matplotlib.gridspec as gridspec
@@ -12,6 +12,7 @@ from rich.console import Console
 from rich.table import Table
 from typing_extensions import Annotated
 
+from hanetoolpy.utils.plot_style import apply_style
 from hanetoolpy.utils.vasp.eigenval import Eigenval
 from hanetoolpy.utils.vasp.outcar import get_fermi_energy
 
@@ -206,17 +207,21 @@ def plot(sym: Annotated[str, typer.Option(help="(hex/rec) Symmetry of the system
     plot the band of 2D material.
     """
     print_args(locals())
-    if index == "Both":
-        info("Start for VB ...")
-        plot(sym=sym, index="VB", soc=soc, axis=axis, dot=dot, line=line, color=color, minus_fermi=minus_fermi,
-             save_name=save_name)
-        info("Start for CB ...")
-        plot(sym=sym, index="CB", soc=soc, axis=axis, dot=dot, line=line, color=color, minus_fermi=minus_fermi,
-             save_name=save_name)
-        return
     sym = sym.lower()
-    # 读取文件
+    # 读取文件 (VB 和 CB 共用同一份数据)
     eigenval = Eigenval(soc=soc)
+    fermi = get_fermi_energy() if minus_fermi else None
+    indexes = ["VB", "CB"] if index == "Both" else [index]
+    for index in indexes:
+        info(f"Start for {index} ...")
+        plot_band(eigenval, sym=sym, index=index, axis=axis, border=border, dot=dot,
+                  line=line, color=color, fermi=fermi, save_name=save_name)
+
+
+def plot_band(eigenval, sym, index, axis, border, dot, line, color, fermi, save_name):
+    """
+    绘制单条能带的全局能带图
+    """
     # 获取数据
     points_df = eigenval.get_band(index=index)
     # 得到笛卡尔坐标
@@ -243,8 +248,7 @@ def plot(sym: Annotated[str, typer.Option(help="(hex/rec) Symmetry of the system
     y = points[:, 1]
     e = points[:, 2]
     # 费密能级设置为 0
-    if minus_fermi:
-        fermi = get_fermi_energy()
+    if fermi is not None:
         e = e - fermi
     # 绘图
     fig, ax = plt.subplots()  # 创建画布
@@ -254,16 +258,8 @@ def plot(sym: Annotated[str, typer.Option(help="(hex/rec) Symmetry of the system
     ax.yaxis.set_major_locator(MultipleLocator(0.1))
     if axis is False:
         ax.axis('off')  # 关闭数据轴
-    # 修改字体
-    import matplotlib.font_manager as fm
-    available_fonts = fm.findSystemFonts()
-    font_name = 'Times New Roman'
-    if font_name in available_fonts:
-        plt.rcParams["font.family"] = font_name
-    # 修改字号
-    config = {"font.size": 20,
-              "mathtext.fontset": 'cm'}
-    plt.rcParams.update(config)
+    # 修改字体和字号
+    apply_style(font_size=20)
     # 等高线
     if line:
         ax.tricontour(x, y, e, linewidths=0.5, colors='k')
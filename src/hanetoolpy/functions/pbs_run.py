@@ -2,7 +2,13 @@ from hanetoolpy.jobs.pbsjob import BasePbsJob
 from hanetoolpy.print.table import print_args
 from hanetoolpy.utils.config import get_config
 
-from pathlib import Path
+import getpass
+import json
+import logging
+from typing import List
+
+import typer
+from typing_extensions import Annotated
 
 config = get_config()
 
@@ -10,6 +16,8 @@ config = get_config()
 def run_sh_with_pbs(
         file: str,
         command: str = None,
+        yes: Annotated[bool, typer.Option(
+            "--yes", "-y", help="Submit without confirmation.")] = False,
 ):
     """
     Run a Script file with pbs.
@@ -22,13 +30,15 @@ def run_sh_with_pbs(
         job.commands.append(file_content)
     else:
         job.commands.append(f"{command} {file}")
-    job.submit()
+    job.submit(assume_yes=yes)
 
 
 def run_py_with_pbs(
         file: str,
         python: str = "python",
         env:str = None,
+        yes: Annotated[bool, typer.Option(
+            "--yes", "-y", help="Submit without confirmation.")] = False,
 ):
     """
     Run a python file with pbs.
@@ -39,7 +49,55 @@ def run_py_with_pbs(
         job.commands.append(f"{python} {file}")
     else:
         job.commands.append(f"conda run -n {env} {python} {file}")
-    job.submit()
+    job.submit(assume_yes=yes)
+
+
+def pbs_status(
+        job_ids: Annotated[List[str], typer.Argument(
+            help="Job IDs to query. (default: all jobs of the current user)",
+            show_default=False)] = None,
+        all_users: Annotated[bool, typer.Option(
+            "--all", help="Show the jobs of all users.")] = False,
+        refresh: Annotated[bool, typer.Option(
+            help="Call qstat even if the cached status is not expired.")] = False,
+        ttl: Annotated[float, typer.Option(
+            help="Seconds to reuse the cached status. (default: pbs.status_ttl in config)")] = None,
+        output: Annotated[str, typer.Option(
+            help="(text/json) Output format.")] = "text",
+):
+    """
+    Show the status of PBS jobs with one qstat call.
+    """
+    from hanetoolpy.jobs.pbsstatus import PbsStatus
+    status = PbsStatus(ttl=ttl)
+    try:
+        status.refresh(force=refresh)
+    except (FileNotFoundError, RuntimeError) as e:
+        logging.error(e)
+        raise typer.Exit(1)
+    if job_ids:
+        jobs = status.get_jobs(job_ids)
+    else:
+        jobs = status.get_jobs()
+        if not all_users:
+            user = getpass.getuser()
+            jobs = {job_id: job for job_id, job in jobs.items()
+                    if str(job["owner"]).split("@")[0] == user}
+    if output == "json":
+        print(json.dumps(jobs, indent=2))
+        return
+    from rich.console import Console
+    from rich.table import Table
+    table = Table(title="PBS jobs")
+    for column in ["Job ID", "Name", "Owner", "State", "Queue", "Walltime"]:
+        table.add_column(column)
+    for job_id, job in jobs.items():
+        if job is None:
+            table.add_row(job_id, "", "", "-", "", "")
+        else:
+            table.add_row(job_id, job["name"], str(job["owner"]).split("@")[0], job["state"],
+                          job["queue"], job["walltime"] or "")
+    Console().print(table)
 
 
 if __name__ == '__main__':
@@ -8,45 +8,36 @@ import pandas as pd
 import typer
 from typing_extensions import Annotated
 
-tensor = ["xx", "xy", "xz",
-          "yx", "yy", "yz",
-          "zx", "zy", "zz"]
-
-
-def get_distance(structure, atom_a, atom_b):
-    # 获取分数坐标
-    atom_a_abc = structure[int(atom_a) - 1].frac_coords
-    atom_b_abc = structure[int(atom_b) - 1].frac_coords
-    # 计算分数坐标差
-    diff_abc = []
-    for i in range(3):
-        diff_i = float(atom_b_abc[i]) - float(atom_a_abc[i])
-        # 去除周期性
-        if diff_i > 0.5:
-            diff_i = diff_i - 1
-        elif diff_i < -0.5:
-            diff_i = diff_i + 1
-        diff_abc.append(diff_i)
-    # 计算物理坐标差
-    diff_xyz = structure.lattice.get_cartesian_coords(diff_abc)
-    # 计算距离
-    diff_xyz = np.array(diff_xyz)
-    distance = np.sqrt(np.sum(diff_xyz ** 2))
-    return distance
+from hanetoolpy.io.phonopy import read_force_constants
+from hanetoolpy.io.vasp import Poscar
+from hanetoolpy.utils.distance import get_pair_distances
 
 
-def read_force_constants(path="FORCE_CONSTANTS"):
-    # 读取文件
-    with open(path, "r") as file:
-        lines = file.readlines()
-    # 去除首行，后每 4 行为一组
-    data_groups = [" ".join(lines[i:i + 4]) for i in range(1, len(lines), 4)]
-    # 分列每组数据，得到二维列表
-    data_list = [i.split() for i in data_groups]
-    # 创建 DataFrame
-    columns = ["atom_a", "atom_b"] + tensor
-    df = pd.DataFrame(data_list, columns=columns)
-    return df
+def get_distance(poscar, atom_a, atom_b):
+    # 原子序号从 1 开始
+    return get_distances(poscar.lattice, poscar.positions,
+                         [int(atom_a)], [int(atom_b)])[0]
+
+
+def get_distances(lattice, positions, atom_a, atom_b):
+    """
+    批量计算原子对的最近镜像距离，atom_a/atom_b 为从 1 开始的原子序号
+    """
+    return get_pair_distances(lattice, positions,
+                              np.asarray(atom_a) - 1, np.asarray(atom_b) - 1)
+
+
+def plot_order_lines(poscar, supercell, y_max):
+    """
+    在图中画出 get_shell_distances 得到的各近邻截断距离
+    """
+    from hanetoolpy.functions.thirdorder import get_shell_distances
+    result = get_shell_distances(poscar, supercell)
+    text_y_list = np.linspace(0.9, 0.2, len(result)) * y_max
+    for order, distance in result.items():
+        plt.axvline(distance * 10, color='grey', linestyle='--', label='order', linewidth=0.8)
+        plt.text(distance * 10 + 0.1, text_y_list[order],
+                 order, ha='left', va='center', color='grey')
 
 
 def plot_rms(df, order=False, poscar=None, supercell=None):
@@ -54,17 +45,7 @@ def plot_rms(df, order=False, poscar=None, supercell=None):
     y = df["rms"]
     plt.scatter(x, y, marker='+', s=50, alpha=1)
     if order:
-        import numpy as np
-
-        from hanetoolpy.functions.thirdorder import get_order_distance
-        result = get_order_distance(poscar, supercell)
-        order = np.array(list(result.keys()))
-        distance = np.array(list(result.values())) * 10
-        text_y_list = np.linspace(0.9, 0.2, len(result)) * max(y)
-        for order, distance in result.items():
-            plt.axvline(distance * 10, color='grey', linestyle='--', label='order', linewidth=0.8)
-            plt.text(distance * 10 + 0.1, text_y_list[order],
-                     order, ha='left', va='center', color='grey')
+        plot_order_lines(poscar, supercell, max(y))
     plt.xlabel('Distance (Ang)')
     plt.ylabel('RMS')
     return plt
@@ -112,19 +93,20 @@ def rms(
     # 读取文件
     workdir = Path(workdir).resolve()
     logging.info("(1/4) Reading FORCE_CONSTANTS ...")
-    df = read_force_constants(workdir / "FORCE_CONSTANTS")
+    atom_a, atom_b, fc = read_force_constants(workdir / "FORCE_CONSTANTS")
+    atom_a, atom_b = [i.ravel() for i in np.meshgrid(atom_a, atom_b, indexing="ij")]
     # 计算 RMS
     logging.info("(2/4) Calculating RMS ...")
-    df["rms"] = (df[tensor].apply(lambda row: row.astype(float).pow(2)).sum(axis=1) / 9) ** 0.5
+    rms_values = np.sqrt(np.mean(fc ** 2, axis=(-2, -1))).ravel()
     # 计算距离
     logging.info("(3/4) Calculating atom distance ...")
-    from pymatgen.core import Structure
-    structure = Structure.from_file(workdir / "SPOSCAR")
-    df["distance"] = df.apply(lambda row: get_distance(
-        structure, row["atom_a"], row["atom_b"]), axis=1)
+    sposcar = Poscar.from_file(workdir / "SPOSCAR")
+    distances = get_distances(sposcar.lattice, sposcar.positions, atom_a, atom_b)
+    df = pd.DataFrame({"distance": distances, "rms": rms_values,
+                       "atom_a": atom_a, "atom_b": atom_b})
     # 输出结果
     logging.info("(4/4) Saving the results ...")
-    df[["distance", "rms", "atom_a", "atom_b"]].to_csv(workdir / f"{savename}.csv", index=False)
+    df.to_csv(workdir / f"{savename}.csv", index=False)
     logging.info(f"{savename}.csv saved.")
     if order and supercell == (0, 0, 0):
         logging.error("if order is True, please input the --supercell.")
@@ -137,5 +119,102 @@ def rms(
     logging.info("Finish!")
 
 
+
+def get_triplet_distances(positions, r2, r3, atoms):
+    """
+    三元组中三个原子两两距离的最大值 (Ang)。
+    positions 为原胞中原子的笛卡尔坐标，r2/r3 为第二、三个原子所在晶胞的平移
+    """
+    atoms = np.asarray(atoms) - 1
+    xyz_a = positions[atoms[:, 0]]
+    xyz_b = positions[atoms[:, 1]] + r2
+    xyz_c = positions[atoms[:, 2]] + r3
+    distances = np.stack([np.linalg.norm(xyz_b - xyz_a, axis=1),
+                          np.linalg.norm(xyz_c - xyz_a, axis=1),
+                          np.linalg.norm(xyz_c - xyz_b, axis=1)])
+    return distances.max(axis=0)
+
+
+def rms_3rd(
+        workdir: Annotated[
+            str,
+            typer.Option("--workdir", "-d")] \
+                = "./",
+        plot: Annotated[
+            bool,
+            typer.Option()] \
+                = True,
+        savename: Annotated[
+            str,
+            typer.Option("--savename", "-s")] \
+                = "hanetoolpy-RMS_of_3FC",
+        chunk_size: Annotated[
+            int,
+            typer.Option(help="Number of triplets per batch")] \
+                = 2 ** 16,
+        order: Annotated[
+            bool,
+            typer.Option(rich_help_panel="Order arguments",
+                         help="Draws order vertical lines")] \
+                = False,
+        supercell: Annotated[
+            Tuple[int, int, int],
+            typer.Option("--supercell", "--sc",
+                         rich_help_panel="Order arguments",
+                         metavar="[INT * 3]",
+                         help="Size of supercell")] \
+                = (0, 0, 0),
+):
+    """
+    Calculate and plot the RMS of FORCE_CONSTANTS_3RD vs the max distance in each triplet.
+
+    \b
+    Required files:
+    | FORCE_CONSTANTS_3RD
+    | POSCAR
+    Output files:
+    | hanetoolpy-RMS_of_3FC.csv
+    | hanetoolpy-RMS_of_3FC.png
+    """
+    from hanetoolpy.io.shengbte import read_force_constants_3rd
+    if order and supercell == (0, 0, 0):
+        logging.error("if order is True, please input the --supercell.")
+        raise typer.Exit(1)
+    # 读取文件
+    workdir = Path(workdir).resolve()
+    logging.info("(1/3) Reading FORCE_CONSTANTS_3RD ...")
+    ifcs = read_force_constants_3rd(workdir / "FORCE_CONSTANTS_3RD")
+    poscar = Poscar.from_file(workdir / "POSCAR")
+    positions = poscar.positions @ poscar.lattice
+    # 分批计算 RMS 和距离，只保留这两列
+    logging.info("(2/3) Calculating RMS and distance ...")
+    n_triplets = len(ifcs["ifc"])
+    rms_values = np.empty(n_triplets)
+    distances = np.empty(n_triplets)
+    with open(workdir / f"{savename}.csv", "w", newline="") as file:
+        file.write("distance,rms,atom_a,atom_b,atom_c\n")
+        for start in range(0, n_triplets, chunk_size):
+            part = slice(start, start + chunk_size)
+            rms_values[part] = np.sqrt(np.mean(ifcs["ifc"][part] ** 2, axis=(1, 2, 3)))
+            distances[part] = get_triplet_distances(
+                positions, ifcs["r2"][part], ifcs["r3"][part], ifcs["atoms"][part])
+            pd.DataFrame({"distance": distances[part], "rms": rms_values[part],
+                          "atom_a": ifcs["atoms"][part, 0],
+                          "atom_b": ifcs["atoms"][part, 1],
+                          "atom_c": ifcs["atoms"][part, 2]}).to_csv(file, header=False, index=False)
+    logging.info(f"{n_triplets} triplets, {savename}.csv saved.")
+    # 输出结果
+    if plot:
+        logging.info("(3/3) Plotting ...")
+        plt.scatter(distances, rms_values, marker='+', s=20, alpha=0.5, rasterized=True)
+        if order:
+            plot_order_lines(workdir / "POSCAR", supercell, rms_values.max())
+        plt.xlabel('Max distance in triplet (Ang)')
+        plt.ylabel('RMS')
+        plt.savefig(workdir / f"{savename}.png")
+        logging.info(f"{savename}.png saved.")
+    # 结束
+    logging.info("Finish!")
+
 if __name__ == '__main__':
     rms(workdir="../test_files/rms", order=True)
@@ -1,6 +1,13 @@
+import csv
 import glob
+import hashlib
+import json
 import logging
+import os
 import shutil
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 from pathlib import Path
 from typing import Tuple
 
@@ -9,30 +16,43 @@ import pandas as pd
 import typer
 from typing_extensions import Annotated
 
+from hanetoolpy.io.vasp import Poscar
+from hanetoolpy.jobs.jobindex import JobIndex, get_job_state, job_state_names
+from hanetoolpy.utils.distance import get_min_image_distances
+
+array_list_name = "hanetoolpy-array_jobs.txt"
+
 
 def check_thirdorder_jobs(path: str = "./",
                           gap: int = 50,
-                          skipfile: str = "SKIP.log"):
+                          skipfile: str = "SKIP.log",
+                          workers: Annotated[int, typer.Option(
+                              help="Number of threads to scan jobs. (default: auto)")] = None,
+                          output: Annotated[str, typer.Option(
+                              help="(text/json/csv) Output format.")] = "text",
+                          index: Annotated[bool, typer.Option(
+                              help=f"Whether to reuse the states saved in {JobIndex.file_name}.")] = True):
     """
     Check the status of jobs.
     """
-    from hanetoolpy.functions.vasp import is_vasp_end
+    if output not in ["text", "json", "csv"]:
+        logging.error(f"Unsupported output format: {output}")
+        raise typer.Exit(1)
     path = Path(path).resolve()
     job_paths = sorted(path.glob("job-*"))
     if len(job_paths) == 0:
         logging.warning("No job-* found, program exit.")
         exit()
-    status = []
-    for job_path in job_paths:
-        state = is_vasp_end(job_path)
-        if state == True:
-            status.append("#")
-        elif (job_path / skipfile).exists():
-            status.append("S")
-        elif state == "Running":
-            status.append("R")
-        else:
-            status.append("_")
+    if index:
+        job_index = JobIndex(path)
+        job_index.prune([job_path.name for job_path in job_paths])
+        get_state = job_index.get_state
+    else:
+        get_state = get_job_state
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        status = list(executor.map(partial(get_state, skipfile=skipfile), job_paths))
+    if index:
+        job_index.save()
     status_text = "".join(status)
     status_count = {}
     status_count["finished"] = status.count("#") + status.count("S")
@@ -40,6 +60,21 @@ def check_thirdorder_jobs(path: str = "./",
     status_count["running"] = status.count("R")
     status_count["unstarted"] = status.count("_")
 
+    if output == "json":
+        result = {"path": str(path), "total": len(status)}
+        result.update(status_count)
+        result["skipped"] = status.count("S")
+        result["jobs"] = {job_path.name: job_state_names[state]
+                          for job_path, state in zip(job_paths, status)}
+        print(json.dumps(result, indent=2))
+        return
+    elif output == "csv":
+        writer = csv.writer(sys.stdout)
+        writer.writerow(["job", "state"])
+        for job_path, state in zip(job_paths, status):
+            writer.writerow([job_path.name, job_state_names[state]])
+        return
+
     def progress_bar(current, maximum, bar_length=50):
         progress = int((current / maximum) * bar_length)
         precent = str(int(current / maximum * 100))
@@ -63,6 +98,135 @@ def check_thirdorder_jobs(path: str = "./",
     print(format(status_text))
 
 
+def submit_array_jobs(
+        path: Annotated[str, typer.Option(
+            help="Directory of job-* folders.",
+            metavar="PATH")] = "./",
+        all_jobs: Annotated[bool, typer.Option(
+            "--all", help="Also submit the finished, skipped and running jobs.")] = False,
+        limit: Annotated[int, typer.Option(
+            help="Maximum number of sub-jobs running at the same time.")] = None,
+        name: Annotated[str, typer.Option(
+            help="Name of the PBS job.")] = "thirdorder",
+        skipfile: str = "SKIP.log",
+        index: Annotated[bool, typer.Option(
+            help=f"Whether to reuse the states saved in {JobIndex.file_name}.")] = True,
+        yes: Annotated[bool, typer.Option(
+            "--yes", "-y", help="Submit without confirmation.")] = False,
+):
+    """
+    Submit the job-* folders as one PBS job array.
+
+    \b
+    Output files:
+    | hanetoolpy-array_jobs.txt
+    """
+    from hanetoolpy.jobs.pbsjob import BasePbsJob, array_index_variable
+    from hanetoolpy.jobs.vaspjob import BaseVaspJob
+
+    path = Path(path).resolve()
+    job_paths = sorted([job for job in path.glob("job-*") if job.is_dir()])
+    if not all_jobs:
+        job_index = JobIndex(path) if index else None
+        get_state = job_index.get_state if index else get_job_state
+        job_paths = [job for job in job_paths if get_state(job, skipfile=skipfile) == "_"]
+        if index:
+            job_index.save()
+    if len(job_paths) == 0:
+        logging.warning("No job-* to submit, program exit.")
+        raise typer.Exit()
+
+    # 第 i 行为第 i 个子任务的目录
+    list_path = path / array_list_name
+    with open(list_path, "w") as file:
+        file.write("\n".join(str(job) for job in job_paths) + "\n")
+    logging.info(f"{len(job_paths)} jobs written to {list_path}.")
+
+    vasp_job = BaseVaspJob()
+    job = BasePbsJob()
+    job.name = name
+    job.ppn = vasp_job.ppn
+    job.workdir = path
+    if len(job_paths) > 1:
+        job.array = f"1-{len(job_paths)}"
+        job.array_limit = limit
+    job.commands.append(f'cd "$(sed -n "{array_index_variable}p" "{list_path}")" || exit 1')
+    job.commands.append(vasp_job.get_command())
+    job.submit(assume_yes=yes)
+
+
+def pack_jobs(
+        path: Annotated[str, typer.Option(
+            help="Directory of job-* folders.",
+            metavar="PATH")] = "./",
+        ppn: Annotated[int, typer.Option(
+            help="Number of cores of the PBS job. (default: pbs.ppn in config)")] = None,
+        cores: Annotated[int, typer.Option(
+            help="Number of cores of each VASP job. (default: mpi.default_ppn in config)")] = None,
+        name: Annotated[str, typer.Option(
+            help="Name of the PBS job.")] = "thirdorder-pack",
+        skipfile: str = "SKIP.log",
+        clear_claims: Annotated[bool, typer.Option(
+            help="Remove the claims of unfinished jobs left by interrupted runs.")] = False,
+        yes: Annotated[bool, typer.Option(
+            "--yes", "-y", help="Submit without confirmation.")] = False,
+):
+    """
+    Run the job-* folders in one PBS job, several VASP jobs at a time.
+    """
+    from hanetoolpy.jobs.pbsjob import pbs_config
+    from hanetoolpy.jobs.vaspjob import PackedVaspJob
+
+    path = Path(path).resolve()
+    job_paths = sorted([job for job in path.glob("job-*") if job.is_dir()])
+    if len(job_paths) == 0:
+        logging.warning("No job-* found, program exit.")
+        raise typer.Exit()
+    job = PackedVaspJob(job_paths, skipfile=skipfile)
+    cores = cores or job.ppn
+    ppn = ppn or pbs_config.get("ppn") or cores
+    if cores > ppn:
+        logging.error(f"Each VASP job needs {cores} cores but the PBS job has only {ppn}.")
+        raise typer.Exit(1)
+    job.ppn = cores
+    job.parallel = ppn // cores
+    if clear_claims:
+        job.clear_claims()
+    logging.info(f"{len(job_paths)} jobs, {job.parallel} VASP jobs x {cores} cores at a time.")
+    job.submit(path, name=name, assume_yes=yes)
+
+
+def pack_worker(
+        path: str = "./",
+        parallel: int = 1,
+        cores: int = None,
+        skipfile: str = "SKIP.log",
+        clear_claims: Annotated[bool, typer.Option(
+            help="Remove the claims of unfinished jobs left by interrupted runs.")] = False,
+):
+    """
+    Run the job-* folders in the current PBS job. (used by thirdorder pack)
+    Exit with 1 if any job is neither finished nor skipped afterwards.
+    """
+    from hanetoolpy.jobs.jobindex import get_job_state
+    from hanetoolpy.jobs.vaspjob import PackedVaspJob
+
+    path = Path(path).resolve()
+    job_paths = sorted([job for job in path.glob("job-*") if job.is_dir()])
+    job = PackedVaspJob(job_paths, parallel=parallel, skipfile=skipfile)
+    if cores is not None:
+        job.ppn = cores
+    if clear_claims:
+        job.clear_claims()
+    count = job.run()
+    logging.info(f"{count} jobs run in {path}.")
+    unfinished = [job_path.name for job_path in job_paths
+                  if get_job_state(job_path, skipfile) not in ("#", "S")]
+    if unfinished:
+        logging.error(f"{len(unfinished)} jobs unfinished: {' '.join(unfinished)}")
+        raise typer.Exit(1)
+
+
 def organize_files(
         poscar_dir: Annotated[str, typer.Option(
             help="Directory containing 3RD.POSCAR.* files.",
@@ -97,22 +261,34 @@ def organize_files(
         input_files[key] = Path(path).resolve()
 
     for poscar in glob.glob(str(poscar_dir / '3RD.POSCAR.*')):
+        if not os.path.isfile(poscar):  # 跳过 3RD.POSCAR.reduced/
+            continue
         job_number = poscar.split('.')[-1]
         job_dir = jobs_dir / f'job-{job_number}'
         job_dir.mkdir(exist_ok=True)
         shutil.move(poscar, job_dir / 'POSCAR')
+        add_input_files(job_dir, input_files, method)
 
-        for file_name, file_source in input_files.items():
-            file_destination = job_dir / file_name
-            if method[0].lower() == 's':  # for softlink
-                file_destination.symlink_to(file_source)
+
+def add_input_files(job_dir, input_files, method='softlink', verbose=True):
+    """
+    将 INCAR KPOINTS POTCAR 等文件链接或复制到任务目录中，已有的文件或链接被替换，可重复运行
+    """
+    for file_name, file_source in input_files.items():
+        file_destination = job_dir / file_name
+        if file_destination.is_symlink() or file_destination.is_file():
+            file_destination.unlink()
+        if method[0].lower() == 's':  # for softlink
+            file_destination.symlink_to(file_source)
+            if verbose:
                 logging.info(str(file_source) + "\tlink to\t" + str(file_destination))
-            elif method[0].lower() == 'c':  # for copy
-                shutil.copy(file_source, file_destination)
+        elif method[0].lower() == 'c':  # for copy
+            shutil.copy(file_source, file_destination)
+            if verbose:
                 logging.info(str(file_source) + "\tcopy to\t" + str(file_destination))
-            else:
-                logging.error(f'Unsupported method: {method}')
-            # info(f'Created {method} file for {config_file} in {job_dir}')
+        else:
+            logging.error(f'Unsupported method: {method}')
+        # info(f'Created {method} file for {config_file} in {job_dir}')
 
 
 def read_header(file_path):
@@ -120,28 +296,42 @@ def read_header(file_path):
         return file.readline().strip()
 
 
-def check_duplicates(path="./", link: bool = True, skipfile="SKIP.log"):
+def check_duplicates(path="./", link: bool = True, skipfile="SKIP.log",
+                     tolerance: Annotated[float, typer.Option(
+                         help="Tolerance of fractional coordinates and lattice (Ang) "
+                              "when comparing structures.")] = 1e-5,
+                     index: Annotated[bool, typer.Option(
+                         help=f"Whether to reuse the hashes saved in {JobIndex.file_name}.")] = True):
     """
     Find duplicate jobs and write SKIP.log.
     """
     work_path = Path(path).resolve()
     jobs = sorted([job for job in list(work_path.glob('job-*')) if job.is_dir()])
-    headers = [read_header(job / "POSCAR") for job in jobs]
-
-    for job, header in zip(jobs, headers):
-        first_job = jobs[headers.index(header)]
+    if index:
+        job_index = JobIndex(work_path)
+        keys = [job_index.get_structure_hash(job, tolerance) for job in jobs]
+        job_index.save()
+    else:
+        keys = [Poscar.from_file(job / "POSCAR").get_hash(tolerance) for job in jobs]
+
+    first_jobs = dict()
+    for job, key in zip(jobs, keys):
+        first_job = first_jobs.setdefault(key, job)
         if job != first_job:
             logging.info(f"{job.name} = {first_job.name}")
             xml_path = job / "vasprun.xml"
             if link:
-                if xml_path.is_symlink():
-                    xml_path.unlink()
-                    logging.info(f"link {xml_path} found, unlinked")
-                elif xml_path.is_file():
-                    xml_path.rename(xml_path.parent / "vasprun.xml.bak")
-                    logging.info(f"file {xml_path} found, renamed it to vasprun.xml.bak")
-                xml_path.symlink_to(first_job / "vasprun.xml")
-                logging.info(f"link {xml_path} created")
+                if xml_path.is_symlink() and Path(os.readlink(xml_path)) == first_job / "vasprun.xml":
+                    logging.info(f"link {xml_path} already exists")
+                else:
+                    if xml_path.is_symlink():
+                        xml_path.unlink()
+                        logging.info(f"link {xml_path} found, unlinked")
+                    elif xml_path.is_file():
+                        xml_path.rename(xml_path.parent / "vasprun.xml.bak")
+                        logging.info(f"file {xml_path} found, renamed it to vasprun.xml.bak")
+                    xml_path.symlink_to(first_job / "vasprun.xml")
+                    logging.info(f"link {xml_path} created")
             with open(job / skipfile, 'w') as file:
                 file.write(f"{job.name} = {first_job.name}")
 
@@ -164,35 +354,95 @@ def read_poscar_for_thirdorder(poscar_path: str) -> dict:
     """
     Return information of POSCAR file for thirdorder.
     """
-    with open(poscar_path, "r") as f:
-        lines = f.readlines()
-
+    poscar = Poscar.from_file(poscar_path)
     data = dict()
+    data["lattvec"] = poscar.lattice.T * 0.1  # Ang -> nm
+    data["elements"] = poscar.elements
+    data["numbers"] = poscar.element_numbers.astype(np.intc)
+    data["positions"] = np.ascontiguousarray(poscar.positions.T)
+    data["types"] = poscar.atom_types().tolist()
+    return data
 
-    # data["comment"] = lines[0]
-
-    data["lattvec"] = np.empty((3, 3))
-    factor = 0.1 * float(lines[1].strip())  # Ang -> nm
-    for i in range(3):
-        data["lattvec"][:, i] = lines[2 + i].split()
-    data["lattvec"] *= factor
-
-    data["elements"] = lines[5].split()
-    data["numbers"] = np.array(lines[6].split()).astype(np.intc)
-
-    typeline = lines[7]
 
-    natoms = data["numbers"].sum()
-    data["positions"] = np.empty((3, natoms))
-    for i in range(natoms):
-        data["positions"][:, i] = [float(j) for j in lines[8 + i].split()]
+def get_supercell(poscar, na, nb, nc):
+    """
+    与 thirdorder_common.gen_SPOSCAR 相同，但用广播代替逐个原子的循环，
+    原子顺序为 (k, j, i, iat)，iat 变化最快
+    """
+    n_cells = na * nb * nc
+    k, j, i = np.meshgrid(range(nc), range(nb), range(na), indexing="ij")
+    cells = np.stack([i.ravel(), j.ravel(), k.ravel()])
+    positions = poscar["positions"][:, np.newaxis, :] + cells[:, :, np.newaxis]
+    positions /= np.array([na, nb, nc], dtype=float)[:, np.newaxis, np.newaxis]
+    sposcar = dict()
+    sposcar["na"], sposcar["nb"], sposcar["nc"] = na, nb, nc
+    sposcar["lattvec"] = np.array(poscar["lattvec"])
+    sposcar["lattvec"][:, 0] *= na
+    sposcar["lattvec"][:, 1] *= nb
+    sposcar["lattvec"][:, 2] *= nc
+    sposcar["elements"] = list(poscar["elements"])
+    sposcar["numbers"] = n_cells * poscar["numbers"]
+    sposcar["positions"] = positions.reshape(3, -1)
+    sposcar["types"] = list(poscar["types"]) * n_cells
+    return sposcar
+
+
+def get_unique_distances(distances):
+    """
+    与 thirdorder 的 calc_frange 相同，在 np.allclose 的误差内合并相等的距离
+    """
+    shells = []
+    for distance in np.unique(distances):
+        if not shells or not np.isclose(shells[-1], distance):
+            shells.append(distance)
+    return np.array(shells)
 
-    data["types"] = [i for i, num in enumerate(data["numbers"]) for _ in range(num)]
 
-    if typeline[0].lower() in ["c", "k"]:
-        data["positions"] = sp.linalg.solve(data["lattvec"],
-                                            data["positions"] * factor)
-    return data
+def get_shell_distances(poscar_path, supercell, maxorder=100, cache=True):
+    """
+    返回 {n: 第 n 近邻的截断距离 (nm)}，与逐个 n 调用 calc_frange 的结果相同。
+    只做一次最近镜像距离计算，结果按 (POSCAR 内容, 扩胞) 缓存在 .hanetoolpy_cache/ 中
+    """
+    from hanetoolpy.utils.cache import cache_version, load_cache, save_cache
+    na, nb, nc = supercell
+    name = f"shells-{na}x{nb}x{nc}"
+    with open(poscar_path, "rb") as file:
+        content = file.read()
+    stamp = hashlib.sha1(f"{cache_version}:{name}:{maxorder}:".encode() + content).hexdigest()
+    data = load_cache(poscar_path, name, stamp) if cache else None
+    if data is not None:
+        return dict(zip(data["orders"].tolist(), data["distances"].tolist()))
+
+    poscar = read_poscar_for_thirdorder(poscar_path)
+    sposcar = get_supercell(poscar, na, nb, nc)
+    # 只需要原胞内原子 (前 natoms 个) 到所有原子的距离
+    natoms = len(poscar["types"])
+    positions = sposcar["positions"].T
+    dmin = get_min_image_distances(sposcar["lattvec"].T, positions[:natoms], positions)
+    shells = [get_unique_distances(row) for row in dmin]
+    warned = False
+    result = dict()
+    prev_frange = 0
+    for nth in range(maxorder + 1):
+        tonth = []
+        for row in shells:
+            if nth + 1 < len(row):
+                tonth.append(0.5 * (row[nth] + row[nth + 1]))
+            else:
+                if not warned:
+                    logging.warning("supercell too small to find n-th neighbours")
+                    warned = True
+                tonth.append(1.1 * row.max())
+        frange = max(tonth)
+        if frange == prev_frange:
+            break
+        result[nth] = frange
+        prev_frange = frange
+    if cache:
+        save_cache(poscar_path, name, stamp,
+                   orders=np.array(list(result.keys())),
+                   distances=np.array(list(result.values())))
+    return result
 
 
 def get_order_distance(
@@ -207,36 +457,11 @@ def get_order_distance(
     """
     Get the relationship between nth nearest-neighbor cutoff and distance cutoff.
     """
-    # from thirdorder_common import functions
-    try:
-        from hanetoolpy.external.thirdorder.thirdorder_common import (
-            calc_dists, calc_frange, gen_SPOSCAR)
-    except ModuleNotFoundError as e:
-        logging.error("you need to put the thirdorder_common.py to \
-hanetoolpy/external/thirdorder/thirdorder_common.py")
-        quit()
-
-    na, nb, nc = supercell
-    poscar = read_poscar_for_thirdorder(poscar)
-    sposcar = gen_SPOSCAR(poscar, na, nb, nc)
-    dmin, nequi, shifts = calc_dists(sposcar)
-    result = dict()
-    prev_frange = 0
-    for nth in range(maxorder + 1):
-        frange = calc_frange(poscar=poscar,
-                             sposcar=None,
-                             n=nth,
-                             dmin=dmin)
-        if frange == prev_frange:
-            break
-        else:
-            result[nth] = frange
-            prev_frange = frange
+    result = get_shell_distances(poscar, supercell, int(maxorder))
     df = pd.DataFrame(pd.DataFrame(list(result.items()), columns=['Order', 'Distance_(nm)']))
     df["Distance_(Ang)"] = df["Distance_(nm)"] * 10
     print(df.to_string(index=False))
     return result
 
-
 if __name__ == '__main__':
     check_duplicates("./jobs")
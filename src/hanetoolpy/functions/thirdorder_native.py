@@ -0,0 +1,376 @@
+import hashlib
+import logging
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from pathlib import Path
+from xml.etree.ElementTree import ParseError
+
+import numpy as np
+import typer
+from typing_extensions import Annotated
+
+from hanetoolpy.functions.thirdorder import add_input_files, get_supercell, read_poscar_for_thirdorder
+from hanetoolpy.functions.thirdorder_symmetry import default_mapfile, expand_forces, file_number, \
+    read_displacement_map
+from hanetoolpy.io.vasp.vasprun import read_final_data, read_forces
+from hanetoolpy.jobs.forcearchive import ForceArchive
+from hanetoolpy.jobs.jobindex import JobIndex, get_job_state
+
+
+def import_thirdorder():
+    """
+    返回 (thirdorder_core, thirdorder_common)，未安装时退出
+    """
+    try:
+        import thirdorder_core
+        from hanetoolpy.external.thirdorder import thirdorder_common
+    except ModuleNotFoundError as error:
+        logging.error(error)
+        logging.error("NOTE: Please confirm that you have installed thirdorder correctly, "
+                      "and put the thirdorder_common.py to hanetoolpy/external/thirdorder/")
+        raise typer.Abort()
+    return thirdorder_core, thirdorder_common
+
+
+def parse_cutoff(cutoff: str):
+    """
+    "-INT" -> (n-th 近邻, None)，"+FLOAT" (Ang) -> (None, 截断距离 nm)
+    """
+    if cutoff.startswith("-"):
+        nneigh = -int(cutoff)
+        if nneigh == 0:
+            raise typer.BadParameter("The n-th neighbor must be a negative integer.")
+        return nneigh, None
+    return None, 0.1 * float(cutoff)
+
+
+def get_unpermutation(sposcar):
+    """
+    VASP 中的原子顺序 (按元素归并) 到 gen_SPOSCAR 中原子顺序的映射，
+    与 thirdorder_vasp.py 的 build_unpermutation 相同
+    """
+    n_atoms = sposcar["positions"].shape[1]
+    indices = np.arange(n_atoms).reshape((sposcar["nc"], sposcar["nb"], sposcar["na"], -1))
+    return np.rollaxis(indices, 3, 0).ravel().argsort()
+
+
+def format_poscar_lines(sposcar):
+    """
+    返回 thirdorder_vasp.py write_POSCAR 格式的 (晶格等头部文本, 每个原子一行的坐标列表)，
+    原子已按 VASP 顺序 (元素归并) 排列
+    """
+    order = get_unpermutation(sposcar).argsort()
+    head = "1.0\n"
+    for i in range(3):
+        head += "{0[0]:>20.15f} {0[1]:>20.15f} {0[2]:>20.15f}\n".format(
+            (sposcar["lattvec"][:, i] * 10.).tolist())
+    head += " ".join(sposcar["elements"]) + "\n"
+    head += " ".join(str(i) for i in sposcar["numbers"]) + "\n"
+    head += "Direct\n"
+    positions = sposcar["positions"][:, order].T
+    lines = ["{0[0]:>20.15f} {0[1]:>20.15f} {0[2]:>20.15f}\n".format(p) for p in positions.tolist()]
+    return head, lines, positions
+
+
+def write_poscar_text(path, body):
+    """
+    与 thirdorder_vasp.py 相同，以内容的 sha1 作为首行
+    """
+    with open(path, "w") as file:
+        file.write(hashlib.sha1(body.encode()).hexdigest() + "\n" + body)
+
+
+def find_force_files(workdir, pattern="job*"):
+    """
+    与 find {pattern} -name vasprun.xml 相同，返回 {任务序号: vasprun.xml 路径}，
+    序号取自所在目录名末尾的数字，不依赖字符串排序
+    """
+    force_files = dict()
+    for match in Path(workdir).glob(pattern):
+        xml_paths = match.rglob("vasprun.xml") if match.is_dir() else [match]
+        for xml_path in xml_paths:
+            if xml_path.name != "vasprun.xml" or not re.search(r"\d+$", xml_path.parent.name):
+                continue
+            force_files[file_number(xml_path.parent)] = xml_path
+    return force_files
+
+
+def get_chunksize(n_tasks, workers=None):
+    return max(1, n_tasks // (4 * (workers or os.cpu_count() or 1)))
+
+
+def read_archived_forces(archive, force_files, n_runs):
+    """
+    从 ForceArchive 中取出 vasprun.xml 未变化的任务的受力，返回 {任务序号: 受力}
+    """
+    forces_dict = dict()
+    for name, entry in archive.jobs.items():
+        number = file_number(name)
+        if not 1 <= number <= n_runs:
+            continue
+        xml_path = force_files.get(number, archive.path.parent / entry["source"] / "vasprun.xml")
+        data = archive.get(name, xml_path)
+        if data is not None:
+            forces_dict[number] = data[0]
+    return forces_dict
+
+
+def read_all_forces(force_files, n_runs, mapping=None, workers=None, archive=None):
+    """
+    用多进程读取 1..n_runs 号任务的受力，返回 (n_runs, n_atoms, 3)。
+    给出 archive 时优先使用其中的数据；
+    缺少 vasprun.xml 的任务若在对称映射中有代表任务，则由代表任务的受力展开
+    """
+    forces_dict = dict() if archive is None else read_archived_forces(archive, force_files, n_runs)
+    if forces_dict:
+        logging.info(f"{len(forces_dict)} jobs read from {archive.path.name}.")
+    numbers = sorted(number for number in force_files
+                     if 1 <= number <= n_runs and number not in forces_dict)
+    if numbers:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = executor.map(read_forces, [force_files[i] for i in numbers],
+                                   chunksize=get_chunksize(len(numbers), workers))
+            forces_dict.update(zip(numbers, results))
+
+    if mapping is not None:
+        names = [int(name) for name in mapping["names"]]
+        for i, (number, representative) in enumerate(zip(names, mapping["representatives"])):
+            first_number = names[representative]
+            if number in forces_dict or first_number not in forces_dict:
+                continue
+            forces_dict[number] = expand_forces(forces_dict[first_number],
+                                                mapping["rotations"][i],
+                                                mapping["permutations"][i])
+
+    missing = [i for i in range(1, n_runs + 1) if i not in forces_dict]
+    if missing:
+        preview = ", ".join(map(str, missing[:10])) + (" ..." if len(missing) > 10 else "")
+        logging.error(f"{len(missing)} of {n_runs} jobs have no forces: {preview}")
+        raise typer.Abort()
+    return np.stack([forces_dict[i] for i in range(1, n_runs + 1)])
+
+
+def native_reap(supercell, cutoff, workdir="./", pattern="job*", workers=None,
+                mapfile=default_mapfile, archive=None):
+    """
+    在当前进程中完成 thirdorder_vasp.py reap:
+    多进程读取 vasprun.xml 中的受力，直接交给 thirdorder_core 重建三阶力常数
+    """
+    thirdorder_core, common = import_thirdorder()
+    workdir = Path(workdir).resolve()
+    na, nb, nc = supercell
+    nneigh, frange = parse_cutoff(cutoff)
+
+    logging.info("(1/4) Analyzing the symmetries ...")
+    poscar = read_poscar_for_thirdorder(workdir / "POSCAR")
+    symops = thirdorder_core.SymmetryOperations(poscar["lattvec"], poscar["types"],
+                                                poscar["positions"].T, common.SYMPREC)
+    sposcar = common.gen_SPOSCAR(poscar, na, nb, nc)
+    dmin, nequi, shifts = common.calc_dists(sposcar)
+    if nneigh is not None:
+        frange = common.calc_frange(poscar, sposcar, nneigh, dmin)
+    logging.info(f"Cutoff: {frange * 10:.4f} Ang")
+    wedge = thirdorder_core.Wedge(poscar, sposcar, symops, dmin, nequi, shifts, frange)
+    list4 = wedge.build_list4()
+    n_irred = len(list4)
+    n_runs = 4 * n_irred
+    logging.info(f"{n_runs} DFT runs are needed.")
+
+    logging.info("(2/4) Reading the forces ...")
+    mapping = None
+    if (workdir / mapfile).exists():
+        mapping = read_displacement_map(workdir / mapfile)
+        logging.info(f"Use the symmetry mapping in {mapfile}.")
+    force_archive = None
+    if archive is not None and Path(archive).exists():
+        archive = Path(archive).resolve()
+        force_archive = ForceArchive(archive.parent, archive.name)
+    force_files = find_force_files(workdir, pattern)
+    forces = read_all_forces(force_files, n_runs, mapping, workers, force_archive)
+    forces = forces[:, get_unpermutation(sposcar), :]
+    average = np.abs(forces.mean(axis=1)).max()
+    logging.info(f"Max average force: {average:.3e} eV/(Ang*atom)")
+
+    logging.info("(3/4) Computing an irreducible set of anharmonic force constants ...")
+    # 第 nirred * n + i 号任务对应 list4[i] 的第 n 种正负位移组合
+    n = np.arange(4)
+    signs = (-1) ** (n // 2) * -(-1) ** (n % 2)
+    forces = forces.reshape(4, n_irred, -1, 3)
+    phipart = -np.einsum("n,nija->aij", signs, forces) / (400. * common.H * common.H)
+
+    logging.info("(4/4) Reconstructing the full array ...")
+    phifull = thirdorder_core.reconstruct_ifcs(phipart, wedge, list4, poscar, sposcar)
+    common.write_ifcs(phifull, poscar, sposcar, dmin, nequi, shifts, frange,
+                      str(workdir / "FORCE_CONSTANTS_3RD"))
+    logging.info("FORCE_CONSTANTS_3RD saved.")
+
+
+def read_job_data(xml_path):
+    """
+    读取一个任务的 (受力, 能量)，失败时返回 (None, 错误信息)
+    """
+    try:
+        return read_final_data(xml_path)
+    except (OSError, ParseError, ValueError) as e:
+        return None, str(e)
+
+
+def read_skip_source(skip_path):
+    """
+    返回 SKIP.log 中记录的重复任务 "job-X = job-Y" 的 job-Y，
+    对称展开得到的任务 ("(symmetry)") 有自己的 vasprun.xml，返回 None
+    """
+    try:
+        with open(skip_path, "r") as file:
+            text = file.read()
+    except OSError:
+        return None
+    if "=" not in text or "(symmetry)" in text:
+        return None
+    return text.split("=", 1)[1].split()[0]
+
+
+def collect_forces(
+        workdir: Annotated[str, typer.Option(
+            help="Directory of job-* folders.",
+            metavar="PATH")] = "./jobs",
+        workers: Annotated[int, typer.Option(
+            help="Number of processes to read vasprun.xml. (default: auto)")] = None,
+        skipfile: str = "SKIP.log",
+        index: Annotated[bool, typer.Option(
+            help=f"Whether to reuse the states saved in {JobIndex.file_name}.")] = True,
+):
+    """
+    Collect the final forces and energies of all finished jobs into one archive.
+
+    \b
+    Only new or changed vasprun.xml are read, and jobs in SKIP.log use the data of their duplicate.
+    `thirdorder reap` reads the archive instead of the vasprun.xml files.
+    \b
+    Output files:
+    | jobs/hanetoolpy-forces.npz
+    """
+    workdir = Path(workdir).resolve()
+    jobs = sorted([job for job in workdir.glob("job-*") if job.is_dir()], key=file_number)
+    archive = ForceArchive(workdir)
+    archive.prune(job.name for job in jobs)
+    job_index = JobIndex(workdir) if index else None
+
+    # 只读取新增或变化的 vasprun.xml
+    to_read = []
+    duplicates = dict()
+    for job in jobs:
+        state = job_index.get_state(job, skipfile) if index else get_job_state(job, skipfile)
+        source = read_skip_source(job / skipfile) if state == "S" else None
+        xml_path = job / "vasprun.xml"
+        if source is not None:
+            duplicates[job.name] = source
+        elif state in ("#", "S") and xml_path.exists():
+            if archive.get(job.name, xml_path) is None:
+                to_read.append(xml_path)
+        else:
+            archive.jobs.pop(job.name, None)
+    logging.info(f"{len(jobs)} jobs found, {len(to_read)} vasprun.xml to read.")
+
+    failed = 0
+    if to_read:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = executor.map(read_job_data, to_read,
+                                   chunksize=get_chunksize(len(to_read), workers))
+            for xml_path, (forces, energy) in zip(to_read, results):
+                if forces is None:
+                    logging.warning(f"{xml_path.parent.name}: {energy}")
+                    archive.jobs.pop(xml_path.parent.name, None)
+                    failed += 1
+                else:
+                    archive.set(xml_path.parent.name, xml_path, forces, energy)
+
+    # 重复的任务使用其首个任务的数据
+    for name, source in duplicates.items():
+        if source in archive.jobs:
+            archive.jobs[name] = dict(archive.jobs[source])
+        else:
+            archive.jobs.pop(name, None)
+            logging.warning(f"{name}: the duplicate {source} has no data yet.")
+
+    archive.save()
+    if index:
+        job_index.save()
+    logging.info(f"{len(archive.jobs)} of {len(jobs)} jobs collected in {archive.path}"
+                 + (f", {failed} failed." if failed else "."))
+
+
+def native_sow(supercell, cutoff, workdir="./", jobs_dir="./jobs", organize=True,
+               input_files=None, method="softlink", workers=None):
+    """
+    在当前进程中完成 thirdorder_vasp.py sow，生成相同的位移构型。
+    organize 为 True 时直接写入 jobs_dir/job-*/POSCAR 并添加输入文件，
+    否则与 thirdorder_vasp.py 相同写出 3RD.POSCAR.*
+    """
+    import scipy.linalg
+    thirdorder_core, common = import_thirdorder()
+    workdir = Path(workdir).resolve()
+    na, nb, nc = supercell
+    nneigh, frange = parse_cutoff(cutoff)
+
+    logging.info("(1/3) Analyzing the symmetries ...")
+    poscar = read_poscar_for_thirdorder(workdir / "POSCAR")
+    symops = thirdorder_core.SymmetryOperations(poscar["lattvec"], poscar["types"],
+                                                poscar["positions"].T, common.SYMPREC)
+    sposcar = get_supercell(poscar, na, nb, nc)
+    dmin, nequi, shifts = common.calc_dists(sposcar)
+    if nneigh is not None:
+        frange = common.calc_frange(poscar, sposcar, nneigh, dmin)
+    logging.info(f"Cutoff: {frange * 10:.4f} Ang")
+    wedge = thirdorder_core.Wedge(poscar, sposcar, symops, dmin, nequi, shifts, frange)
+    list4 = wedge.build_list4()
+    n_irred = len(list4)
+    n_runs = 4 * n_irred
+    logging.info(f"{n_runs} DFT runs are needed.")
+
+    logging.info("(2/3) Writing 3RD.SPOSCAR ...")
+    head, lines, positions = format_poscar_lines(sposcar)
+    write_poscar_text(workdir / "3RD.SPOSCAR", head + "".join(lines))
+
+    logging.info("(3/3) Writing the displaced structures ...")
+    # 与 move_two_atoms 相同的分数坐标位移 (坐标轴, 正负) -> 位移
+    frac_moves = dict()
+    for coord in range(3):
+        for sign in (1, -1):
+            move = np.zeros(3)
+            move[coord] = sign * common.H
+            frac_moves[coord, sign] = scipy.linalg.solve(sposcar["lattvec"], move)
+    atom_order = get_unpermutation(sposcar)
+    width = len(str(4 * (n_irred + 1)))
+    jobs_dir = Path(jobs_dir).resolve()
+    if organize:
+        jobs_dir.mkdir(parents=True, exist_ok=True)
+
+    def write_job(number):
+        i, n = (number - 1) % n_irred, (number - 1) // n_irred
+        e = list4[i]
+        isign = (-1) ** (n // 2)
+        jsign = -(-1) ** (n % 2)
+        moved = dict()
+        for atom, coord, sign in ((e[1], e[3], isign), (e[0], e[2], jsign)):
+            index = atom_order[atom]
+            moved[index] = moved.get(index, positions[index]) + frac_moves[coord, sign]
+        job_lines = list(lines)
+        for index, position in moved.items():
+            job_lines[index] = "{0[0]:>20.15f} {0[1]:>20.15f} {0[2]:>20.15f}\n".format(position.tolist())
+        name = "{0:0{1}d}".format(number, width)
+        if organize:
+            job_dir = jobs_dir / f"job-{name}"
+            job_dir.mkdir(exist_ok=True)
+            write_poscar_text(job_dir / "POSCAR", head + "".join(job_lines))
+            add_input_files(job_dir, input_files or dict(), method, verbose=False)
+        else:
+            write_poscar_text(workdir / f"3RD.POSCAR.{name}", head + "".join(job_lines))
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        list(executor.map(write_job, range(1, n_runs + 1)))
+    if organize:
+        logging.info(f"{n_runs} jobs written to {jobs_dir}.")
+    else:
+        logging.info(f"{n_runs} 3RD.POSCAR.* written.")
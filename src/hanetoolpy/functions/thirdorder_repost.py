@@ -33,7 +33,29 @@ def sow(
             str, typer.Argument(metavar="-INT|+FLOAT",
                                 help="negative integer (n-th) or positive float (Ang)")],
         thirdorder_vasp_path: Annotated[
-            str, typer.Argument(metavar="PATH", )] = default_thirdorder_vasp_path
+            str, typer.Argument(metavar="PATH", )] = default_thirdorder_vasp_path,
+        native: Annotated[
+            bool, typer.Option(help="generate the structures inside hanetoolpy "
+                                    "instead of running thirdorder_vasp.py")] = True,
+        organize: Annotated[
+            bool, typer.Option(help="(native only) write job-*/POSCAR with the input files "
+                                    "directly, otherwise write 3RD.POSCAR.*")] = True,
+        jobs_dir: Annotated[
+            str, typer.Option("--workdir", help="directory to write the jobs",
+                              metavar="PATH")] = "./jobs",
+        incar_path: Annotated[str, typer.Option(
+            "--incar", help="Path to INCAR file.",
+            metavar="PATH", rich_help_panel="Input files")] = './INCAR',
+        kpoints_path: Annotated[str, typer.Option(
+            "--kpoints", help="Path to KPOINTS file.",
+            metavar="PATH", rich_help_panel="Input files")] = './KPOINTS',
+        potcar_path: Annotated[str, typer.Option(
+            "--potcar", help="Path to POTCAR file.",
+            metavar="PATH", rich_help_panel="Input files")] = './POTCAR',
+        method: Annotated[str, typer.Option(
+            help="(softlink/copy) Method for organizing files.")] = 'softlink',
+        workers: Annotated[
+            int, typer.Option(help="number of threads to write the jobs (default: auto)")] = None,
 ):
     """
     run the thirdorder_vasp.py sow
@@ -44,8 +66,18 @@ def sow(
     \b
     Output files:
     | 3RD.SPOSCAR
-    | 3RD.POSCAR.*
+    | 3RD.POSCAR.* or jobs/job-*
     """
+    if native:
+        from hanetoolpy.functions.thirdorder_native import native_sow
+        input_files = dict()
+        if organize:
+            input_files = {"INCAR": Path(incar_path).resolve(),
+                           "KPOINTS": Path(kpoints_path).resolve(),
+                           "POTCAR": Path(potcar_path).resolve()}
+        native_sow(supercell, cutoff, jobs_dir=jobs_dir, organize=organize,
+                   input_files=input_files, method=method, workers=workers)
+        return
     check_thirdorder_vasp(thirdorder_vasp_path)
     python_command = "python"
     supercell = " ".join(map(str, supercell))
@@ -68,8 +100,21 @@ def reap(
                 = default_thirdorder_vasp_path,
         pattern: Annotated[
             str,
-            typer.Option(help="negative integer (n-th) or positive float (Ang)")]
+            typer.Option(help="pattern of the folders to search for vasprun.xml")]
                 = "job*",
+        native: Annotated[
+            bool,
+            typer.Option(help="read the forces in parallel inside hanetoolpy "
+                              "instead of piping them to thirdorder_vasp.py")]
+                = True,
+        workers: Annotated[
+            int,
+            typer.Option(help="number of processes to read vasprun.xml (default: auto)")]
+                = None,
+        archive: Annotated[
+            str,
+            typer.Option(help="forces collected by `thirdorder collect`, used if it exists")]
+                = "./jobs/hanetoolpy-forces.npz",
 ):
     """
     run the thirdorder_vasp.py reap
@@ -82,6 +127,10 @@ def reap(
     Output files:
     | FORCE_CONSTANTS_3RD
     """
+    if native:
+        from hanetoolpy.functions.thirdorder_native import native_reap
+        native_reap(supercell, cutoff, pattern=pattern, workers=workers, archive=archive)
+        return
     check_thirdorder_vasp(thirdorder_vasp_path)
     python_command = "python"
     supercell = " ".join(map(str, supercell))
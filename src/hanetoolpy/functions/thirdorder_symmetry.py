@@ -0,0 +1,236 @@
+import logging
+import re
+import shutil
+from pathlib import Path
+
+import numpy as np
+import typer
+from typing_extensions import Annotated
+
+from hanetoolpy.io.vasp import Poscar
+
+default_mapfile = "hanetoolpy-displacement_map.npz"
+reduced_dir_name = "3RD.POSCAR.reduced"
+
+
+def wrap_positions(positions):
+    """
+    将分数坐标移入 [0, 1)
+    """
+    positions = np.mod(positions, 1.0)
+    positions[positions >= 1.0] = 0.0
+    return positions
+
+
+def get_symmetry_operations(sposcar: Poscar, symprec=1e-5):
+    """
+    Return the rotations and translations (fractional) of the supercell and
+    the atom permutations: operation `o` moves atom `i` to atom `permutations[o, i]`.
+    """
+    import spglib
+    from scipy.spatial import cKDTree
+
+    types = sposcar.atom_types()
+    symmetry = spglib.get_symmetry((sposcar.lattice, sposcar.positions, types),
+                                   symprec=symprec)
+    rotations = symmetry["rotations"]
+    translations = symmetry["translations"]
+    # 对所有操作一次性变换坐标，再用周期性 KD 树匹配原子
+    new_positions = np.einsum("oij,nj->oni", rotations, sposcar.positions)
+    new_positions += translations[:, np.newaxis, :]
+    tree = cKDTree(wrap_positions(sposcar.positions), boxsize=1.0)
+    distances, permutations = tree.query(wrap_positions(new_positions.reshape(-1, 3)))
+    permutations = permutations.reshape(len(rotations), -1)
+    lattice_length = np.linalg.norm(sposcar.lattice, axis=1).max()
+    if distances.max() * lattice_length > 10 * symprec or np.any(types[permutations] != types):
+        raise ValueError("Failed to map the atoms by the symmetry operations.")
+    return rotations, translations, permutations
+
+
+def get_displacements(poscar: Poscar, sposcar: Poscar, tolerance=1e-5):
+    """
+    Return the displaced atoms and their displacements (fractional).
+    """
+    diff = poscar.positions - sposcar.positions
+    diff -= np.rint(diff)
+    norms = np.linalg.norm(diff @ sposcar.lattice, axis=1)
+    atoms = np.nonzero(norms > tolerance)[0]
+    return atoms, diff[atoms]
+
+
+def get_canonical_form(atoms, displacements, rotations, permutations, lattice, tolerance=1e-5):
+    """
+    对 (原子, 位移) 施加所有对称操作，取字典序最小的结果作为等价类的标识，
+    返回 (标识, 对应的操作序号)
+    """
+    n_ops = len(rotations)
+    if len(atoms) == 0:
+        # 同一原子正负位移相消，结构与 SPOSCAR 相同
+        return b"", 0
+    mapped_atoms = permutations[:, atoms]
+    mapped = np.einsum("oij,kj->oki", rotations, displacements) @ lattice
+    mapped = np.rint(mapped / tolerance).astype(np.int64)
+    order = np.argsort(mapped_atoms, axis=1, kind="stable")
+    mapped_atoms = np.take_along_axis(mapped_atoms, order, axis=1)
+    mapped = np.take_along_axis(mapped, order[:, :, np.newaxis], axis=1)
+    rows = np.concatenate([mapped_atoms[:, :, np.newaxis], mapped], axis=2).reshape(n_ops, -1)
+    best = int(np.lexsort(rows.T[::-1])[0])
+    return rows[best].tobytes(), best
+
+
+def to_cartesian_rotation(rotation, lattice):
+    """
+    将分数坐标下的旋转矩阵转换为笛卡尔坐标下的旋转矩阵
+    """
+    return lattice.T @ rotation @ np.linalg.inv(lattice.T)
+
+
+def expand_forces(forces, rotation, permutation):
+    """
+    Return the forces of an equivalent job from the forces of its representative:
+    F[permutation[i]] = rotation @ forces[i]
+    """
+    result = np.empty_like(forces)
+    result[permutation] = forces @ rotation.T
+    return result
+
+
+def file_number(path):
+    """
+    文件或目录名末尾的序号，如 3RD.POSCAR.0012 或 job-0012 -> 12
+    """
+    return int(re.search(r"(\d+)$", Path(path).name).group(1))
+
+
+def reduce_displacements(
+        poscar_dir: Annotated[str, typer.Option(
+            help="Directory containing 3RD.SPOSCAR and 3RD.POSCAR.* files.",
+            metavar="PATH")] = "./",
+        symprec: Annotated[float, typer.Option(
+            help="Tolerance (Ang) of the symmetry search.")] = 1e-5,
+        tolerance: Annotated[float, typer.Option(
+            help="Tolerance (Ang) when comparing displacements.")] = 1e-5,
+        mapfile: Annotated[str, typer.Option(
+            help="Name of the mapping file.")] = default_mapfile,
+):
+    """
+    Keep one 3RD.POSCAR.* for each class of symmetry-equivalent displacements.
+
+    \b
+    Required files:
+    | 3RD.SPOSCAR
+    | 3RD.POSCAR.*
+    Output files:
+    | hanetoolpy-displacement_map.npz
+    | 3RD.POSCAR.reduced/3RD.POSCAR.*
+    """
+    try:
+        import spglib
+    except ModuleNotFoundError as error:
+        logging.error(error)
+        logging.error("NOTE: Please install spglib to use the symmetry reduction.")
+        raise typer.Abort()
+    poscar_dir = Path(poscar_dir).resolve()
+    sposcar = Poscar.from_file(poscar_dir / "3RD.SPOSCAR")
+    poscar_paths = [path for path in poscar_dir.glob("3RD.POSCAR.*") if path.is_file()]
+    poscar_paths = sorted(poscar_paths, key=file_number)
+    if len(poscar_paths) == 0:
+        logging.warning("No 3RD.POSCAR.* found, program exit.")
+        raise typer.Exit()
+
+    logging.info("(1/3) Finding the symmetry operations of 3RD.SPOSCAR ...")
+    rotations, translations, permutations = get_symmetry_operations(sposcar, symprec)
+    inverse_permutations = np.argsort(permutations, axis=1)
+    logging.info(f"{len(rotations)} symmetry operations found.")
+
+    logging.info("(2/3) Grouping the displacements ...")
+    names = []
+    operations = []
+    representatives = []
+    first_jobs = dict()
+    for path in poscar_paths:
+        atoms, displacements = get_displacements(Poscar.from_file(path), sposcar, tolerance)
+        key, operation = get_canonical_form(atoms, displacements, rotations, permutations,
+                                            sposcar.lattice, tolerance)
+        names.append(path.name.split(".")[-1])
+        operations.append(operation)
+        representatives.append(first_jobs.setdefault(key, len(names) - 1))
+
+    # 由代表任务 A 得到等价任务 B: B = g_B^-1 g_A (A)
+    n_atoms = len(sposcar.positions)
+    cart_rotations = np.empty((len(names), 3, 3))
+    job_permutations = np.empty((len(names), n_atoms), dtype=np.int64)
+    for i, representative in enumerate(representatives):
+        op_a = operations[representative]
+        op_b = operations[i]
+        rotation = np.linalg.inv(rotations[op_b]) @ rotations[op_a]
+        cart_rotations[i] = to_cartesian_rotation(rotation, sposcar.lattice)
+        job_permutations[i] = inverse_permutations[op_b][permutations[op_a]]
+
+    logging.info("(3/3) Saving the results ...")
+    np.savez(poscar_dir / mapfile,
+             names=np.array(names),
+             representatives=np.array(representatives),
+             rotations=cart_rotations,
+             permutations=job_permutations)
+    reduced_dir = poscar_dir / reduced_dir_name
+    reduced_dir.mkdir(exist_ok=True)
+    for i, (path, representative) in enumerate(zip(poscar_paths, representatives)):
+        if representative != i:
+            shutil.move(path, reduced_dir / path.name)
+    n_classes = len(set(representatives))
+    logging.info(f"{len(names)} displacements -> {n_classes} representative jobs.")
+    logging.info(f"Mapping saved to {poscar_dir / mapfile}.")
+
+
+def read_displacement_map(path=default_mapfile):
+    with np.load(path, allow_pickle=False) as data:
+        return {key: data[key] for key in data.files}
+
+
+def expand_displacements(
+        workdir: Annotated[str, typer.Option(
+            help="Directory of job-* folders.",
+            metavar="PATH")] = "./jobs",
+        poscar_dir: Annotated[str, typer.Option(
+            help="Directory containing the mapping file and 3RD.POSCAR.reduced/.",
+            metavar="PATH")] = "./",
+        mapfile: Annotated[str, typer.Option(
+            help="Name of the mapping file.")] = default_mapfile,
+        skipfile: str = "SKIP.log",
+):
+    """
+    Write the forces of symmetry-equivalent jobs from their representative jobs.
+
+    \b
+    Required files:
+    | hanetoolpy-displacement_map.npz
+    | job-*/vasprun.xml (representative jobs)
+    Output files:
+    | job-*/vasprun.xml (equivalent jobs)
+    """
+    from hanetoolpy.io.vasp.vasprun import read_forces, write_forces
+    workdir = Path(workdir).resolve()
+    poscar_dir = Path(poscar_dir).resolve()
+    mapping = read_displacement_map(poscar_dir / mapfile)
+    names = mapping["names"]
+    forces_cache = dict()
+    for i, representative in enumerate(mapping["representatives"]):
+        if representative == i:
+            continue
+        job_dir = workdir / f"job-{names[i]}"
+        first_job = workdir / f"job-{names[representative]}"
+        if representative not in forces_cache:
+            forces_cache[representative] = read_forces(first_job / "vasprun.xml")
+        forces = expand_forces(forces_cache[representative],
+                               mapping["rotations"][i],
+                               mapping["permutations"][i])
+        job_dir.mkdir(exist_ok=True)
+        reduced_poscar = poscar_dir / reduced_dir_name / f"3RD.POSCAR.{names[i]}"
+        if reduced_poscar.exists() and not (job_dir / "POSCAR").exists():
+            shutil.copy(reduced_poscar, job_dir / "POSCAR")
+        write_forces(job_dir / "vasprun.xml", forces,
+                     comment=f"expanded by hanetoolpy from {first_job.name}")
+        with open(job_dir / skipfile, "w") as file:
+            file.write(f"{job_dir.name} = {first_job.name} (symmetry)")
+        logging.info(f"{job_dir.name} = {first_job.name} (symmetry)")
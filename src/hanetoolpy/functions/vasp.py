@@ -22,12 +22,11 @@ def is_vasp_end(path="./"):
     path = Path(path).resolve()
     outcar_path = path / "OUTCAR"
     if outcar_path.exists():
-        with outcar_path.open('r') as f:
-            content = f.read()
-            if "Total CPU time used" in content:
-                return True
-            else:
-                return "Running"
+        from hanetoolpy.utils.vasp.outcar import is_outcar_end
+        if is_outcar_end(outcar_path):
+            return True
+        else:
+            return "Running"
     else:
         return False
 
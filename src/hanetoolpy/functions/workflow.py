@@ -0,0 +1,151 @@
+import logging
+from pathlib import Path
+from typing import Tuple
+
+import typer
+from typing_extensions import Annotated
+
+from hanetoolpy.jobs.workflow import Workflow, hnt_command, queue_unknown
+
+
+def get_queue_states(workflow):
+    """
+    用一次 qstat 得到各阶段任务在队列中的状态 {任务号: 状态}
+    """
+    from hanetoolpy.jobs.pbsstatus import PbsStatus
+    job_ids = [stage["jobid"] for stage in workflow.stages.values() if stage.get("jobid")]
+    if len(job_ids) == 0:
+        return dict()
+    jobs = PbsStatus(ttl=0).get_jobs(job_ids)
+    return {job_id: None if job is None else job["state"] for job_id, job in jobs.items()}
+
+
+def print_stages(workflow, queue_states, resubmit=()):
+    from rich.console import Console
+    from rich.table import Table
+    table = Table(title=str(workflow.path))
+    for column in ["Stage", "Depends", "State", "Job ID", "Queue", "Action"]:
+        table.add_column(column)
+    for name in workflow.get_order():
+        stage = workflow.stages[name]
+        table.add_row(name, ", ".join(stage["depends"]), stage["state"],
+                      stage.get("jobid") or "", queue_states.get(stage.get("jobid")) or "",
+                      "submit" if name in resubmit else "")
+    Console().print(table)
+
+
+def workflow_run(
+        supercell: Annotated[Tuple[int, int, int], typer.Option(
+            "--supercell", "--sc", metavar="[INT * 3]", help="Size of supercell")],
+        cutoff: Annotated[str, typer.Option(
+            metavar="-INT|+FLOAT", help="negative integer (n-th) or positive float (Ang)")],
+        ngrid: Annotated[Tuple[int, int, int], typer.Option(
+            metavar="[INT * 3]", help="ngrid of the ShengBTE CONTROL file")] = (1, 1, 1),
+        fc2_supercell: Annotated[Tuple[int, int, int], typer.Option(
+            "--fc2-supercell", metavar="[INT * 3]",
+            help="Supercell of FORCE_CONSTANTS_2ND. (default: --supercell)")] = (0, 0, 0),
+        workdir: Annotated[str, typer.Option(
+            help="Directory containing POSCAR, INCAR, KPOINTS and POTCAR.",
+            metavar="PATH")] = "./",
+        ppn: Annotated[int, typer.Option(
+            help="Number of cores of the VASP stage. (default: pbs.ppn in config)")] = None,
+        cores: Annotated[int, typer.Option(
+            help="Number of cores of each VASP job. (default: mpi.default_ppn in config)")] = None,
+        yes: Annotated[bool, typer.Option(
+            "--yes", "-y", help="Submit without confirmation.")] = False,
+):
+    """
+    Submit sow -> VASP -> reap and the ShengBTE CONTROL as dependent PBS jobs.
+
+    Run it again to resume: finished stages are kept, stages still in the queue are reused,
+    and the failed or lost stages are submitted again with their dependents.
+
+    \b
+    Required files:
+    | POSCAR INCAR KPOINTS POTCAR
+    Output files:
+    | hanetoolpy-workflow.json
+    | jobs/job-*
+    | FORCE_CONSTANTS_3RD
+    | CONTROL
+    """
+    from hanetoolpy.cui.confirm import confirm
+    from hanetoolpy.jobs.pbsjob import pbs_config
+    from hanetoolpy.utils.config import get_config
+
+    cores = cores or get_config()["mpi"]["default_ppn"]
+    ppn = ppn or pbs_config.get("ppn") or cores
+    if cores > ppn:
+        logging.error(f"Each VASP job needs {cores} cores but the VASP stage has only {ppn}.")
+        raise typer.Exit(1)
+    if fc2_supercell == (0, 0, 0):
+        fc2_supercell = supercell
+    supercell = [str(i) for i in supercell]
+    workflow = Workflow(workdir)
+    with workflow.lock():
+        workflow.load()
+        # "--" 之后为位置参数，cutoff 可以是负数
+        workflow.add_stage("sow", hnt_command("thirdorder", "sow", "--workdir", "jobs",
+                                              "--", *supercell, cutoff))
+        workflow.add_stage("vasp", hnt_command("thirdorder", "pack-worker", "--path", "jobs",
+                                               "--parallel", ppn // cores, "--cores", cores,
+                                               "--clear-claims"),
+                           depends=["sow"], ppn=ppn)
+        workflow.add_stage("reap", hnt_command("thirdorder", "reap", "--", *supercell, cutoff),
+                           depends=["vasp"], ppn=cores)
+        workflow.add_stage("control", hnt_command("shengbte", "control", "--supercell", *fc2_supercell,
+                                                  "-n", *ngrid))
+        workflow.save()
+
+    try:
+        queue_states = get_queue_states(workflow)
+    except (FileNotFoundError, RuntimeError) as e:
+        logging.warning(f"{e}; submitted stages are assumed to be still in the queue.")
+        queue_states = {stage["jobid"]: queue_unknown for stage in workflow.stages.values()
+                        if stage["state"] == "submitted" and stage.get("jobid")}
+    resubmit = workflow.plan(queue_states)
+    print_stages(workflow, queue_states, resubmit)
+    if len(resubmit) == 0:
+        logging.info("Nothing to submit.")
+        return
+    if not (yes or confirm(f"Confirm to submit {len(resubmit)} stages?", default=True)):
+        raise typer.Exit()
+    try:
+        workflow.submit(queue_states)
+    except (OSError, RuntimeError) as e:
+        logging.error(e)
+        raise typer.Exit(1)
+
+
+def workflow_mark(
+        name: Annotated[str, typer.Argument(help="Name of the stage.")],
+        state: Annotated[str, typer.Argument(help="(pending/submitted/done/failed) State of the stage.")],
+        path: Annotated[str, typer.Option(help="Directory of the workflow.", metavar="PATH")] = "./",
+):
+    """
+    Record the state of a workflow stage. (called by the stage jobs)
+    """
+    try:
+        Workflow(path).mark(name, state)
+    except (KeyError, ValueError) as e:
+        logging.error(e)
+        raise typer.Exit(1)
+    logging.info(f"Stage {name}: {state}")
+
+
+def workflow_status(
+        path: Annotated[str, typer.Option(help="Directory of the workflow.", metavar="PATH")] = "./",
+):
+    """
+    Show the stages of the workflow and their jobs in the queue.
+    """
+    workflow = Workflow(path)
+    if not Path(workflow.path).exists():
+        logging.warning(f"No {Workflow.file_name} found, program exit.")
+        raise typer.Exit()
+    try:
+        queue_states = get_queue_states(workflow)
+    except (FileNotFoundError, RuntimeError) as e:
+        logging.warning(e)
+        queue_states = dict()
+    print_stages(workflow, queue_states)
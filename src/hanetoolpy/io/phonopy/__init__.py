@@ -0,0 +1 @@
+from .force_constants import iter_force_constants, read_force_constants
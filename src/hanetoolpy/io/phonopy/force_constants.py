@@ -0,0 +1,60 @@
+import numpy as np
+
+from hanetoolpy.utils.cache import commit_memmap_cache, get_stamp, load_memmap_cache, open_memmap_cache
+from hanetoolpy.utils.grep_get import iter_token_blocks
+
+
+def read_force_constants_shape(path="FORCE_CONSTANTS"):
+    """
+    返回 FORCE_CONSTANTS 首行的 (n1, n2)，旧格式只有一个数时 n1 = n2
+    """
+    with open(path, "r") as file:
+        header = file.readline().split()
+    n1 = int(header[0])
+    n2 = int(header[1]) if len(header) > 1 else n1
+    return n1, n2
+
+
+def iter_force_constants(path="FORCE_CONSTANTS", chunk_bytes=2 ** 22):
+    """
+    分块读取 phonopy 的 FORCE_CONSTANTS，
+    每次产出 (atom_a, atom_b, fc)，原子序号从 1 开始，fc 的形状为 (m, 3, 3)
+    """
+    with open(path, "r") as file:
+        file.readline()
+        # 每组 11 个数: 两个原子序号 + 3x3 力常数
+        for blocks in iter_token_blocks(file, 11, chunk_bytes):
+            yield blocks[:, 0].astype(int), blocks[:, 1].astype(int), blocks[:, 2:].reshape(-1, 3, 3)
+
+
+def read_force_constants(path="FORCE_CONSTANTS", cache=True, chunk_bytes=2 ** 22):
+    """
+    读取 FORCE_CONSTANTS，返回 (atom_a, atom_b, fc)，fc 的形状为 (n1, n2, 3, 3)。
+    cache 为 True 时写入 .hanetoolpy_cache/ 中的 .npy 文件，再次读取时使用内存映射
+    """
+    n1, n2 = read_force_constants_shape(path)
+    stamp = get_stamp(path)
+    arrays = load_memmap_cache(path, "fc2", stamp) if cache else None
+    if arrays is None:
+        shapes = {"atom_a": ((n1,), np.int64),
+                  "atom_b": ((n2,), np.int64),
+                  "fc": ((n1, n2, 3, 3), np.float64)}
+        if cache:
+            arrays = open_memmap_cache(path, "fc2", shapes)
+        else:
+            arrays = {key: np.empty(shape, dtype=dtype) for key, (shape, dtype) in shapes.items()}
+        fc = arrays["fc"].reshape(n1 * n2, 3, 3)
+        start = 0
+        for atom_a, atom_b, fc_chunk in iter_force_constants(path, chunk_bytes):
+            if start + len(fc_chunk) > n1 * n2:
+                break
+            index = np.arange(start, start + len(fc_chunk))
+            arrays["atom_a"][index // n2] = atom_a
+            arrays["atom_b"][index % n2] = atom_b
+            fc[index] = fc_chunk
+            start += len(fc_chunk)
+        if start != n1 * n2:
+            raise ValueError(f"{path} does not contain the {n1 * n2} blocks given in the header.")
+        if cache:
+            commit_memmap_cache(path, "fc2", stamp, arrays)
+    return arrays["atom_a"], arrays["atom_b"], arrays["fc"]
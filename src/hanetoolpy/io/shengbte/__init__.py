@@ -1 +1,2 @@
-from .control import Control
\ No newline at end of file
+from .control import Control
+from .force_constants_3rd import iter_force_constants_3rd, read_force_constants_3rd
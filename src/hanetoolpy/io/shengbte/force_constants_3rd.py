@@ -0,0 +1,63 @@
+import numpy as np
+
+from hanetoolpy.utils.cache import commit_memmap_cache, get_stamp, load_memmap_cache, open_memmap_cache
+from hanetoolpy.utils.grep_get import iter_token_blocks
+
+# 每组 118 个数: 序号, R2 (3), R3 (3), 三个原子序号, 27 行 "a b c 力常数"
+block_tokens = 1 + 3 + 3 + 3 + 27 * 4
+
+
+def read_force_constants_3rd_number(path="FORCE_CONSTANTS_3RD"):
+    """
+    返回 FORCE_CONSTANTS_3RD 首行的三元组数目
+    """
+    with open(path, "r") as file:
+        return int(file.readline().split()[0])
+
+
+def iter_force_constants_3rd(path="FORCE_CONSTANTS_3RD", chunk_bytes=2 ** 22):
+    """
+    分块读取 ShengBTE 的 FORCE_CONSTANTS_3RD，每次产出一个 dict:
+    r2, r3 (m, 3) 为第二、三个原子所在晶胞的笛卡尔坐标 (Ang)，
+    atoms (m, 3) 为从 1 开始的原子序号，ifc (m, 3, 3, 3) 的单位为 eV/Ang^3
+    """
+    with open(path, "r") as file:
+        file.readline()
+        for blocks in iter_token_blocks(file, block_tokens, chunk_bytes):
+            yield {"r2": blocks[:, 1:4],
+                   "r3": blocks[:, 4:7],
+                   "atoms": blocks[:, 7:10].astype(np.int64),
+                   "ifc": blocks[:, 10:].reshape(-1, 27, 4)[:, :, 3].reshape(-1, 3, 3, 3)}
+
+
+def read_force_constants_3rd(path="FORCE_CONSTANTS_3RD", cache=True, chunk_bytes=2 ** 22):
+    """
+    读取 FORCE_CONSTANTS_3RD，返回与 iter_force_constants_3rd 相同键的 dict。
+    cache 为 True 时写入 .hanetoolpy_cache/ 中的 .npy 文件，再次读取时使用内存映射，
+    可逐块遍历而不必将整个文件载入内存
+    """
+    n = read_force_constants_3rd_number(path)
+    stamp = get_stamp(path)
+    arrays = load_memmap_cache(path, "fc3", stamp) if cache else None
+    if arrays is None:
+        shapes = {"r2": ((n, 3), np.float64),
+                  "r3": ((n, 3), np.float64),
+                  "atoms": ((n, 3), np.int64),
+                  "ifc": ((n, 3, 3, 3), np.float64)}
+        if cache:
+            arrays = open_memmap_cache(path, "fc3", shapes)
+        else:
+            arrays = {key: np.empty(shape, dtype=dtype) for key, (shape, dtype) in shapes.items()}
+        start = 0
+        for chunk in iter_force_constants_3rd(path, chunk_bytes):
+            stop = start + len(chunk["ifc"])
+            if stop > n:
+                break
+            for key, value in chunk.items():
+                arrays[key][start:stop] = value
+            start = stop
+        if start != n:
+            raise ValueError(f"{path} does not contain the {n} triplets given in the header.")
+        if cache:
+            commit_memmap_cache(path, "fc3", stamp, arrays)
+    return arrays
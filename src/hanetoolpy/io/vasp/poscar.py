@@ -1,18 +1,51 @@
+import hashlib
+import warnings
+
 import numpy as np
 
+from hanetoolpy.utils.distance import get_min_image_distances, get_pair_distances
+
+
+def is_number(text):
+    try:
+        float(text)
+    except ValueError:
+        return False
+    return True
+
+
+def parse_vectors(lines, n_columns=3):
+    """
+    将若干行的前 n_columns 列一次转换为 (行数, n_columns) 的数组，
+    每行恰好 n_columns 个数时直接整体解析
+    """
+    with warnings.catch_warnings():
+        # 含有非数字 (如 T/F) 时 fromstring 会给出警告，改用逐行拆分
+        warnings.simplefilter("error", DeprecationWarning)
+        try:
+            values = np.fromstring(" ".join(lines), sep=" ")
+        except (DeprecationWarning, ValueError):
+            values = None
+    if values is not None and values.size == len(lines) * n_columns:
+        return values.reshape(-1, n_columns)
+    return np.array([line.split()[:n_columns] for line in lines], dtype=float)
+
 
 class Poscar:
     """the class of POSCAR file for VASP"""
 
-    def __init__(self, path):
+    def __init__(self, path=None):
         self.header = "POSCAR"
         self.lattice = np.empty((3, 3))
         self.lattice_unit = "Ang"
         self.elements = None
         self.element_numbers = None
         self.positions = None
+        self.selective_dynamics = None
+        self.velocities = None
         self.path = path
-        self.read()
+        if path is not None:
+            self.read()
 
     @staticmethod
     def from_file(path):
@@ -20,35 +53,124 @@ class Poscar:
 
     def read(self):
         with open(self.path, "r") as f:
-            lines = f.readlines()
+            lines = f.read().splitlines()
 
         # header
-        self.header = lines[0]
+        self.header = lines[0].strip()
 
-        # lattice
-        factor = float(lines[1].strip())
-        for i in range(3):
-            self.lattice[i] = [float(j) for j in lines[2 + i].split()]
-        self.lattice *= factor
+        # lattice: 缩放系数可以是 1 个数、负数 (体积) 或 3 个数 (分别作用于 x, y, z)
+        factor = np.array(lines[1].split()[:3], dtype=float)
+        self.lattice = parse_vectors(lines[2:5])
+        if factor.size == 3:
+            self.lattice *= factor
+        elif factor[0] < 0:
+            factor = np.cbrt(-factor[0] / abs(np.linalg.det(self.lattice)))
+            self.lattice *= factor
+        else:
+            factor = factor[0]
+            self.lattice *= factor
 
-        # elements
-        self.elements = lines[5].split()
-        self.element_numbers = np.array(lines[6].split()).astype(int)
+        # elements: VASP 5 有元素行，VASP 4 没有，尝试从首行注释中读取
+        line = 5
+        if is_number(lines[line].split()[0]):
+            self.element_numbers = np.array(lines[line].split()).astype(int)
+            names = self.header.split()
+            if len(names) == len(self.element_numbers) and all(name.isalpha() for name in names):
+                self.elements = names
+            else:
+                self.elements = [f"X{i + 1}" for i in range(len(self.element_numbers))]
+        else:
+            self.elements = lines[line].split()
+            line += 1
+            self.element_numbers = np.array(lines[line].split()).astype(int)
+        line += 1
+        natoms = self.element_numbers.sum()
+
+        # selective dynamics
+        selective = lines[line].strip()[:1].lower() == "s"
+        if selective:
+            line += 1
 
         # type
-        typeline = lines[7]
-        natoms = self.element_numbers.sum()
+        typeline = lines[line].strip()
+        line += 1
 
         # positions
-        self.positions = np.empty((natoms, 3))
-        for i in range(natoms):
-            self.positions[i] = [float(j) for j in lines[8 + i].split()]
+        position_lines = lines[line:line + natoms]
+        line += natoms
+        self.positions = parse_vectors(position_lines)
+        if selective:
+            flags = np.array([l.split()[3:6] for l in position_lines])
+            self.selective_dynamics = np.char.upper(flags) == "T"
+        if typeline[:1].lower() in ["c", "k"]:
+            cartesian = self.positions * factor
+            self.positions = np.linalg.solve(self.lattice.T, cartesian.T).T
 
-        # type
-        if typeline[0].lower() in ["c", "k"]:
-            import scipy
-            self.positions = scipy.linalg.solve(self.lattice, self.positions * factor)
+        # velocities: 空行或坐标类型行之后的 natoms 行
+        while line < len(lines) and not lines[line].strip():
+            line += 1
+        if line < len(lines) and lines[line].strip()[:1].lower() in ["c", "k", "d"]:
+            line += 1
+        velocity_lines = lines[line:line + natoms]
+        if len(velocity_lines) == natoms and all(len(l.split()) >= 3 for l in velocity_lines):
+            try:
+                self.velocities = parse_vectors(velocity_lines)
+            except ValueError:
+                self.velocities = None
+
+    def write(self, path=None, direct=True):
+        """
+        写出 VASP 5 格式的 POSCAR，缩放系数为 1.0
+        """
+        path = self.path if path is None else path
+        lines = [self.header, "1.0"]
+        lines += ["  {:21.16f} {:21.16f} {:21.16f}".format(*vector) for vector in self.lattice]
+        lines.append(" " + " ".join(self.elements))
+        lines.append(" " + " ".join(str(i) for i in self.element_numbers))
+        if self.selective_dynamics is not None:
+            lines.append("Selective dynamics")
+        if direct:
+            lines.append("Direct")
+            positions = self.positions
+        else:
+            lines.append("Cartesian")
+            positions = self.positions @ self.lattice
+        position_lines = ["  {:19.16f} {:19.16f} {:19.16f}".format(*p) for p in positions]
+        if self.selective_dynamics is not None:
+            position_lines = [line + " " + " ".join("T" if i else "F" for i in flags)
+                              for line, flags in zip(position_lines, self.selective_dynamics)]
+        lines += position_lines
+        if self.velocities is not None:
+            lines.append("")
+            lines += ["  {:16.8e} {:16.8e} {:16.8e}".format(*v) for v in self.velocities]
+        with open(path, "w") as f:
+            f.write("\n".join(lines) + "\n")
 
     def atom_types(self, start=0):
         types = [i for i, num in enumerate(self.element_numbers) for _ in range(num)]
         return np.array(types) + start
+
+    def get_hash(self, tolerance=1e-5):
+        """
+        由按 tolerance 取整的晶格和分数坐标得到结构的 sha1，
+        相同结构 (在误差内) 得到相同的值，与首行注释无关
+        """
+        positions = np.mod(self.positions, 1.0)
+        positions[positions > 1.0 - tolerance / 2] -= 1.0  # 接近 1 的坐标视为 0
+        rounded_positions = np.rint(positions / tolerance).astype(np.int64)
+        rounded_lattice = np.rint(self.lattice / tolerance).astype(np.int64)
+        sha1 = hashlib.sha1()
+        sha1.update(" ".join(self.elements).encode())
+        sha1.update(np.asarray(self.element_numbers, dtype=np.int64).tobytes())
+        sha1.update(rounded_lattice.tobytes())
+        sha1.update(rounded_positions.tobytes())
+        return sha1.hexdigest()
+
+    def get_distances(self, atom_a=None, atom_b=None):
+        """
+        原子间的最近镜像距离 (Ang)，atom_a/atom_b 为从 0 开始的序号。
+        都为 None 时返回所有原子对的距离矩阵，否则返回逐对的距离
+        """
+        if atom_a is None and atom_b is None:
+            return get_min_image_distances(self.lattice, self.positions)
+        return get_pair_distances(self.lattice, self.positions, atom_a, atom_b)
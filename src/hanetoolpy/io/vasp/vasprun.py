@@ -0,0 +1,49 @@
+from xml.etree.ElementTree import iterparse
+
+import numpy as np
+
+
+def read_final_data(path):
+    """
+    从 vasprun.xml 中读取最后一组 <varray name="forces"> 和最后一个 e_fr_energy，
+    使用 iterparse 边读边释放已解析的元素，返回 (forces, energy)，没有能量时为 nan
+    """
+    forces = None
+    energy = np.nan
+    for event, element in iterparse(path, events=("end",)):
+        if element.tag == "varray" and element.get("name") == "forces":
+            text = " ".join(v.text for v in element)
+            forces = np.array(text.split(), dtype=float).reshape(-1, 3)
+        elif element.tag == "i" and element.get("name") == "e_fr_energy":
+            energy = float(element.text)
+        if element.tag != "v":
+            element.clear()
+    if forces is None:
+        raise ValueError(f"No forces found in {path}")
+    return forces, energy
+
+
+def read_forces(path):
+    """
+    从 vasprun.xml 中读取最后一组受力
+    """
+    return read_final_data(path)[0]
+
+
+def write_forces(path, forces, comment=None):
+    """
+    写出只含 forces 的最简 vasprun.xml，可被 thirdorder_vasp.py reap 读取
+    """
+    lines = ['<?xml version="1.0" encoding="ISO-8859-1"?>',
+             "<modeling>"]
+    if comment is not None:
+        lines.append(f" <!-- {comment} -->")
+    lines.append(" <calculation>")
+    lines.append('  <varray name="forces" >')
+    for force in forces:
+        lines.append("   <v> {:16.8f} {:16.8f} {:16.8f} </v>".format(*force))
+    lines.append("  </varray>")
+    lines.append(" </calculation>")
+    lines.append("</modeling>")
+    with open(path, "w") as file:
+        file.write("\n".join(lines) + "\n")
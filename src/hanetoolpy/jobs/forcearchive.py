@@ -0,0 +1,82 @@
+#!/usr/bin/env python
+# Standard library imports
+import logging
+import os
+from pathlib import Path
+
+# Third-party imports
+import numpy as np
+
+# Application-specific imports
+from hanetoolpy.jobs.jobindex import get_file_stamp
+
+
+class ForceArchive:
+    """
+    保存在任务目录中的受力和能量汇总，每个任务记录 vasprun.xml 的 [大小, 修改时间]，
+    文件未变化时直接使用汇总中的数据。汇总文件默认为 workdir/hanetoolpy-forces.npz
+    """
+    file_name = "hanetoolpy-forces.npz"
+
+    def __init__(self, workdir, file_name=None):
+        self.path = Path(workdir) / (file_name or self.file_name)
+        self.jobs = dict()
+        self.load()
+
+    def load(self):
+        if not self.path.exists():
+            return
+        try:
+            # NpzFile 的每次索引都会重新解压整个数组，只读取一次
+            with np.load(self.path, allow_pickle=False) as data:
+                names, stamps, sources, forces, energies = (
+                    data[key] for key in ("names", "stamps", "sources", "forces", "energies"))
+            for i, name in enumerate(names):
+                self.jobs[str(name)] = {"stamp": stamps[i].tolist(),
+                                        "source": str(sources[i]),
+                                        "forces": forces[i],
+                                        "energy": float(energies[i])}
+        except (OSError, ValueError, KeyError) as e:
+            logging.warning(f"Failed to read force archive {self.path}: {e}")
+            self.jobs = dict()
+
+    def save(self):
+        names = sorted(self.jobs)
+        shapes = {self.jobs[name]["forces"].shape for name in names}
+        if len(shapes) > 1:
+            raise ValueError(f"Jobs with different numbers of atoms: {shapes}")
+        temp_path = self.path.with_name(f"{self.path.name}.{os.getpid()}.tmp")
+        try:
+            with open(temp_path, "wb") as file:
+                np.savez(file,
+                         names=np.array(names, dtype=str),
+                         stamps=np.array([self.jobs[name]["stamp"] for name in names],
+                                         dtype=np.int64).reshape(-1, 2),
+                         sources=np.array([self.jobs[name]["source"] for name in names], dtype=str),
+                         forces=np.array([self.jobs[name]["forces"] for name in names]),
+                         energies=np.array([self.jobs[name]["energy"] for name in names]))
+            os.replace(temp_path, self.path)
+        except OSError as e:
+            logging.warning(f"Failed to write force archive {self.path}: {e}")
+
+    def prune(self, job_names):
+        """
+        删除已不存在的任务
+        """
+        job_names = set(job_names)
+        self.jobs = {name: entry for name, entry in self.jobs.items() if name in job_names}
+
+    def get(self, name, xml_path):
+        """
+        返回任务的 (受力, 能量)，vasprun.xml 已变化或不在汇总中时返回 None
+        """
+        entry = self.jobs.get(name)
+        if entry is None or entry["stamp"] != get_file_stamp(xml_path):
+            return None
+        return entry["forces"], entry["energy"]
+
+    def set(self, name, xml_path, forces, energy, source=None):
+        self.jobs[name] = {"stamp": get_file_stamp(xml_path),
+                           "source": name if source is None else source,
+                           "forces": np.asarray(forces, dtype=float),
+                           "energy": float(energy)}
@@ -0,0 +1,142 @@
+#!/usr/bin/env python
+# Standard library imports
+import hashlib
+import json
+import logging
+import os
+from pathlib import Path
+
+# Third-party imports
+
+# Application-specific imports
+from hanetoolpy.functions.vasp import is_vasp_end
+from hanetoolpy.io.vasp import Poscar
+
+job_state_names = {
+    "#": "finished",
+    "S": "skipped",
+    "R": "running",
+    "_": "unstarted",
+}
+
+
+def get_job_state(job_path, skipfile="SKIP.log"):
+    """
+    Return the state of a job: "#" finished, "S" skipped, "R" running, "_" unstarted.
+    """
+    state = is_vasp_end(job_path)
+    if state == True:
+        return "#"
+    elif (job_path / skipfile).exists():
+        return "S"
+    elif state == "Running":
+        return "R"
+    else:
+        return "_"
+
+
+def get_file_stamp(path):
+    """
+    返回文件的 [大小, 修改时间]，文件不存在时返回 None
+    """
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+class JobIndex:
+    """
+    保存在任务目录中的任务状态索引，OUTCAR 未变化的任务不再重复读取
+    """
+    file_name = "hanetoolpy-job_index.json"
+    version = 2
+
+    def __init__(self, workdir):
+        self.path = Path(workdir) / self.file_name
+        self.jobs = dict()
+        self.load()
+
+    def load(self):
+        if not self.path.exists():
+            return
+        try:
+            with open(self.path, "r") as file:
+                data = json.load(file)
+        except (OSError, ValueError) as e:
+            logging.warning(f"Failed to read job index {self.path}: {e}")
+            return
+        if data.get("version") == self.version:
+            self.jobs = data.get("jobs", dict())
+
+    def save(self):
+        temp_path = self.path.with_name(f"{self.path.name}.{os.getpid()}.tmp")
+        try:
+            with open(temp_path, "w") as file:
+                json.dump({"version": self.version, "jobs": self.jobs}, file)
+            os.replace(temp_path, self.path)
+        except OSError as e:
+            logging.warning(f"Failed to write job index {self.path}: {e}")
+
+    def prune(self, job_names):
+        """
+        删除索引中已不存在的任务
+        """
+        job_names = set(job_names)
+        self.jobs = {name: entry for name, entry in self.jobs.items() if name in job_names}
+
+    def get_state(self, job_path, skipfile="SKIP.log"):
+        """
+        与 get_job_state 相同，但仅在 OUTCAR 大小或修改时间变化时重新读取 OUTCAR，
+        skipfile 可能被单独创建或删除，每次都重新检查
+        """
+        job_path = Path(job_path)
+        entry = self.jobs.get(job_path.name, dict())
+        outcar_stamp = get_file_stamp(job_path / "OUTCAR")
+        if "state" in entry and entry.get("outcar") == outcar_stamp:
+            state = entry["state"]
+            if state != "#" and (job_path / skipfile).exists():
+                state = "S"
+            elif state == "S":
+                state = get_job_state(job_path, skipfile)
+        else:
+            state = get_job_state(job_path, skipfile)
+        entry.update(state=state, outcar=outcar_stamp)
+        self.jobs[job_path.name] = entry
+        return state
+
+    def get_poscar_key(self, job_path, name, function, file_name="POSCAR"):
+        """
+        返回由 POSCAR 计算得到的值 function(path)，POSCAR 未变化时使用索引中的值
+        """
+        job_path = Path(job_path)
+        entry = self.jobs.setdefault(job_path.name, dict())
+        poscar_stamp = get_file_stamp(job_path / file_name)
+        if entry.get("poscar") != poscar_stamp:
+            entry["poscar"] = poscar_stamp
+            entry["keys"] = dict()
+        keys = entry.setdefault("keys", dict())
+        if name not in keys:
+            keys[name] = function(job_path / file_name)
+        return keys[name]
+
+    def get_header_hash(self, job_path, file_name="POSCAR"):
+        """
+        返回 POSCAR 首行的 sha1
+        """
+        def header_hash(path):
+            with open(path, "r") as file:
+                header = file.readline().strip()
+            return hashlib.sha1(header.encode()).hexdigest()
+
+        return self.get_poscar_key(job_path, "header", header_hash, file_name)
+
+    def get_structure_hash(self, job_path, tolerance=1e-5, file_name="POSCAR"):
+        """
+        返回 POSCAR 结构的 sha1，见 Poscar.get_hash
+        """
+        def structure_hash(path):
+            return Poscar.from_file(path).get_hash(tolerance)
+
+        return self.get_poscar_key(job_path, f"structure-{tolerance:g}", structure_hash, file_name)
@@ -1,5 +1,12 @@
 #!/usr/bin/env python
 # Standard library imports
+import os
+import re
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
 from subprocess import run
 from dataclasses import dataclass, field
 from typing import Any
@@ -16,6 +23,38 @@ from hanetoolpy.cui.confirm import confirm
 
 config = get_config()
 pbs_config = config["pbs"]
+# 任务数组中子任务的序号: Torque 为 PBS_ARRAYID，PBS Pro 为 PBS_ARRAY_INDEX，非数组任务为 1
+array_index_variable = "${PBS_ARRAYID:-${PBS_ARRAY_INDEX:-1}}"
+
+
+def parse_job_id(output):
+    """
+    从 qsub 的输出中得到任务号: Torque/PBS Pro 输出 "123.server" 或 "123[].server"
+    """
+    for line in reversed(output.strip().splitlines()):
+        match = re.match(r"^\s*(\d+(\[\d*\])?(\.\S+)?)\s*$", line)
+        if match:
+            return match.group(1)
+    return None
+
+
+class RateLimiter:
+    """
+    限制多个线程调用 wait() 的频率不超过每秒 rate 次
+    """
+
+    def __init__(self, rate=None):
+        self.interval = 1 / rate if rate else 0
+        self.lock = threading.Lock()
+        self.next_time = 0
+
+    def wait(self):
+        with self.lock:
+            now = time.monotonic()
+            delay = self.next_time - now
+            self.next_time = max(now, self.next_time) + self.interval
+        if delay > 0:
+            time.sleep(delay)
 
 
 @dataclass
@@ -37,6 +76,10 @@ class BasePbsJob:
     mail_options: str = pbs_config.get("mail_options")  # -m [b][a][e]
     mail_address: str = pbs_config.get("mail_address")  # -M
     name: str = pbs_config.get("name")  # -N
+    array: Any = None  # -t / -J, e.g. "1-100"
+    array_limit: Any = None  # 同时运行的子任务数, e.g. "1-100%10"
+    array_flag: str = pbs_config.get("array_flag", "-t")
+    depend: Any = None  # -W depend=, e.g. "afterok:123.server"
     stdout: Any = None  # -o
     stderr: Any = None  # -e
     # job args
@@ -47,31 +90,40 @@ class BasePbsJob:
     file: Any = None
     jobid: Any = None
 
-    def submit(self):
-        cmd = ["qsub"]
-        console = Console()
-        table = Table(title="PBS running arguments")
-        table.add_column("Arg")
-        table.add_column("Value")
+    def get_qsub_args(self):
+        """
+        返回 qsub 的参数和用于显示的 (参数, 值) 列表
+        """
+        cmd = []
+        rows = []
         if self.workdir:
-            table.add_row("workdir", str(self.workdir))
+            rows.append(("workdir", str(self.workdir)))
             cmd.extend(["-d", str(self.workdir)])
         if self.name:
-            table.add_row("name", str(self.name))
+            rows.append(("name", str(self.name)))
             cmd.extend(["-N", self.name])
+        if self.array:
+            array = str(self.array)
+            if self.array_limit:
+                array += f"%{self.array_limit}"
+            rows.append(("array", array))
+            cmd.extend([self.array_flag, array])
+        if self.depend:
+            rows.append(("depend", str(self.depend)))
+            cmd.extend(["-W", f"depend={self.depend}"])
         if self.nodes is not None and self.ppn is None:
             nodes = str(self.nodes)
-            table.add_row("nodes", nodes)
+            rows.append(("nodes", nodes))
             cmd.extend(["-l", f"node={nodes}"])
         elif self.ppn is not None:
             ppn = str(self.ppn)
             nodes = self.nodes or 1
             nodes = str(nodes)
-            table.add_row("nodes", nodes)
-            table.add_row("ppn", ppn)
+            rows.append(("nodes", nodes))
+            rows.append(("ppn", ppn))
             cmd.extend(["-l", f"nodes={nodes}:ppn={ppn}"])
         if self.walltime:
-            table.add_row("walltime", self.walltime)
+            rows.append(("walltime", self.walltime))
             cmd.extend(["-l", f"walltime={self.walltime}"])
         if self.join:
             cmd.extend(["-j", self.join])
@@ -80,47 +132,73 @@ class BasePbsJob:
         if self.stderr:
             cmd.extend(["-e", self.stderr])
         if self.mail_options:
-            table.add_row("mail options", str(self.mail_options))
+            rows.append(("mail options", str(self.mail_options)))
             cmd.extend(["-m", self.mail_options])
         if self.mail_address:
-            table.add_row("mail address", str(self.mail_address))
+            rows.append(("mail address", str(self.mail_address)))
             cmd.extend(["-M", self.mail_address])
-        temp_path = "temp.pbs"
-        table.add_row("file", temp_path)
-        file_commands = self.pre_commands + self.commands + self.post_commands
-        file_content = "\n".join(file_commands)
+        return cmd, rows
+
+    def get_script(self):
+        return "\n".join(self.pre_commands + self.commands + self.post_commands)
+
+    def write_script(self, directory=None):
+        """
+        将脚本写入 directory (默认为 workdir 或当前目录) 中名字唯一的 .pbs 文件，
+        同时提交多个任务时不会互相覆盖
+        """
+        directory = directory or self.workdir or Path.cwd()
+        fd, path = tempfile.mkstemp(prefix=f"{self.name or 'hanetoolpy'}-", suffix=".pbs",
+                                    dir=directory)
+        with os.fdopen(fd, "w") as file:
+            file.write(self.get_script() + "\n")
+        self.file = path
+        return path
+
+    def qsub(self):
+        """
+        提交已写好的脚本 self.file，返回并记录任务号
+        """
+        result = run(["qsub"] + self.get_qsub_args()[0] + [str(self.file)],
+                     capture_output=True, text=True)
+        if result.returncode != 0:
+            raise RuntimeError(f"qsub failed for {self.file}: {result.stderr.strip()}")
+        self.jobid = parse_job_id(result.stdout)
+        return self.jobid
+
+    def submit(self, assume_yes=False):
+        console = Console()
+        cmd, rows = self.get_qsub_args()
+        self.write_script()
+        table = Table(title="PBS running arguments")
+        table.add_column("Arg")
+        table.add_column("Value")
+        for row in rows + [("file", str(self.file))]:
+            table.add_row(*row)
+        file_content = self.get_script()
         from rich.syntax import Syntax
         if len(self.commands) >= 2:
             syntax = Syntax(file_content, "bash", line_numbers=True)
         else:
             syntax = Syntax(file_content, "bash")
-        with open(temp_path, "w") as file:
-            file.write(file_content)
-        self.file = "temp.pbs"
-        cmd.append(self.file)
         console.print(table)  # PBS running arguments
-        console.print(f"The content of {temp_path} is:")
+        console.print(f"The content of {self.file} is:")
         console.print(Panel(syntax,
-                            title=temp_path))
+                            title=str(self.file)))
         console.print("The following command will be executed:")
-        command = " ".join(cmd)
+        command = " ".join(["qsub"] + cmd + [str(self.file)])
         console.print(Panel(command))
-        confirm_run = confirm("Confirm to submit this job?", default=True)
-        if confirm_run:
-            try:
-                result = run(command, shell=True, capture_output=True, text=True)
-            except FileNotFoundError as e:
-                print(e)
-                error("qsub 命令执行失败")
-            console.print(result.stdout)
-        else:
+        if not (assume_yes or confirm("Confirm to submit this job?", default=True)):
+            os.remove(self.file)
             exit()
-        # output = result.stdout.strip()
-        # if output.startswith("Your job"):
-        #     self.jobid = output.split()[2]
-        #     print("Job", self.jobid, "submitted.")
-        # else:
-        #     print("Error submitting job:", output)
+        try:
+            self.qsub()
+        except (FileNotFoundError, RuntimeError) as e:
+            print(e)
+            error("qsub 命令执行失败")
+            return None
+        console.print(f"Job {self.jobid} submitted.")
+        return self.jobid
 
     def cancel(self):
         if self.jobid is not None:
@@ -131,15 +209,44 @@ class BasePbsJob:
 
     def get_status(self):
         if self.jobid is not None:
-            result = run(
-                ["qstat", "-f", self.jobid], capture_output=True, text=True)
-            output = result.stdout.strip()
-            if output.startswith("Job Id:"):
-                status = output.split("job_state = ")[1].split()[0]
-                return status
+            from hanetoolpy.jobs.pbsstatus import PbsStatus
+            return PbsStatus().get_state(self.jobid)
         return None
 
 
+def submit_jobs(jobs, assume_yes=False, workers=8, rate=50):
+    """
+    批量提交: 为每个任务写入唯一的脚本，只确认一次，
+    用 workers 个线程、每秒最多 rate 次调用 qsub，返回任务号列表 (失败的为 None)
+    """
+    jobs = list(jobs)
+    if len(jobs) == 0:
+        return []
+    for job in jobs:
+        job.write_script()
+    cmd, _ = jobs[0].get_qsub_args()
+    info(f"{len(jobs)} jobs to submit, e.g. {' '.join(['qsub'] + cmd + [str(jobs[0].file)])}")
+    if not (assume_yes or confirm(f"Confirm to submit these {len(jobs)} jobs?", default=True)):
+        for job in jobs:
+            os.remove(job.file)
+        return [None] * len(jobs)
+    limiter = RateLimiter(rate)
+
+    def submit_one(job):
+        limiter.wait()
+        try:
+            return job.qsub()
+        except (OSError, RuntimeError) as e:
+            warning(e)
+            return None
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        job_ids = list(executor.map(submit_one, jobs))
+    n_failed = job_ids.count(None)
+    info(f"{len(jobs) - n_failed} jobs submitted, {n_failed} failed.")
+    return job_ids
+
+
 if __name__ == "__main__":
     job = BasePbsJob()
     job.jobname = "myjob"
@@ -0,0 +1,175 @@
+#!/usr/bin/env python
+# Standard library imports
+import json
+import logging
+import os
+import time
+from pathlib import Path
+from subprocess import run
+
+# Third-party imports
+
+# Application-specific imports
+from hanetoolpy.utils.config import get_config
+
+default_cache_path = Path.home() / ".cache" / "hanetoolpy" / "qstat.json"
+# 仍在队列中的 PBS 任务状态，C/F/X 为已结束
+queue_alive_states = ("Q", "R", "H", "W", "T", "B", "E", "S")
+# 缓存中每个任务保留的属性
+job_fields = {
+    "name": "Job_Name",
+    "owner": "Job_Owner",
+    "state": "job_state",
+    "queue": "queue",
+    "walltime": "resources_used.walltime",
+    "exec_host": "exec_host",
+}
+
+
+def flatten_attributes(attributes, prefix=""):
+    """
+    将 qstat -F json 的嵌套属性展开为与 qstat -f 相同的 "a.b" 形式
+    """
+    result = dict()
+    for key, value in attributes.items():
+        if isinstance(value, dict):
+            result.update(flatten_attributes(value, prefix=f"{prefix}{key}."))
+        else:
+            result[f"{prefix}{key}"] = str(value)
+    return result
+
+
+def parse_qstat_json(text):
+    """
+    解析 qstat -f -F json (PBS Pro) 的输出，返回 {任务号: 属性}
+    """
+    data = json.loads(text, strict=False)  # Variable_List 中可能有控制字符
+    return {job_id: flatten_attributes(attributes)
+            for job_id, attributes in data.get("Jobs", dict()).items()}
+
+
+def parse_qstat_text(text):
+    """
+    解析 qstat -f 的输出，返回 {任务号: 属性}，以制表符开头的行是上一行的续行
+    """
+    jobs = dict()
+    attributes = None
+    key = None
+    for line in text.splitlines():
+        if line.startswith("Job Id:"):
+            attributes = dict()
+            jobs[line.split(":", 1)[1].strip()] = attributes
+            key = None
+        elif attributes is None or not line.strip():
+            continue
+        elif line.startswith("\t") and key is not None:
+            attributes[key] += line.strip()
+        elif " = " in line:
+            key, value = line.strip().split(" = ", 1)
+            attributes[key] = value
+    return jobs
+
+
+def query_qstat(use_json=True):
+    """
+    调用一次 qstat 得到所有任务的属性，不支持 -F json 时 (如 Torque) 解析文本输出，
+    返回 (属性, 是否使用了 json)
+    """
+    if use_json:
+        result = run(["qstat", "-f", "-F", "json"], capture_output=True, text=True)
+        if result.returncode == 0:
+            try:
+                return parse_qstat_json(result.stdout), True
+            except ValueError as e:
+                logging.debug(f"Failed to parse qstat json output: {e}")
+    result = run(["qstat", "-f"], capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"qstat failed: {result.stderr.strip()}")
+    return parse_qstat_text(result.stdout), False
+
+
+def short_job_id(job_id):
+    """
+    任务号的数字部分，如 123.server 和 123.server.domain -> 123，数组任务 123[].server -> 123[]
+    """
+    return str(job_id).strip().split(".")[0]
+
+
+class PbsStatus:
+    """
+    所有任务状态的缓存，超过 ttl 秒后重新调用 qstat，多个进程共用同一个缓存文件
+    """
+
+    def __init__(self, ttl=None, cache_path=default_cache_path):
+        if ttl is None:
+            ttl = get_config()["pbs"].get("status_ttl", 30)
+        self.ttl = ttl
+        self.cache_path = Path(cache_path)
+        self.time = None
+        self.jobs = dict()
+        self.use_json = True
+
+    def load(self):
+        try:
+            with open(self.cache_path, "r") as file:
+                data = json.load(file)
+        except (OSError, ValueError):
+            return False
+        self.use_json = data.get("json", True)
+        if time.time() - data.get("time", 0) > self.ttl:
+            return False
+        self.time = data["time"]
+        self.jobs = data["jobs"]
+        return True
+
+    def save(self):
+        temp_path = self.cache_path.with_name(f"{self.cache_path.name}.{os.getpid()}.tmp")
+        try:
+            self.cache_path.parent.mkdir(parents=True, exist_ok=True)
+            with open(temp_path, "w") as file:
+                json.dump({"time": self.time, "json": self.use_json, "jobs": self.jobs}, file)
+            os.replace(temp_path, self.cache_path)
+        except OSError as e:
+            logging.warning(f"Failed to write qstat cache {self.cache_path}: {e}")
+
+    def refresh(self, force=False):
+        """
+        缓存过期 (或 force) 时重新调用 qstat，返回是否调用了 qstat
+        """
+        if not force and self.time is not None and time.time() - self.time <= self.ttl:
+            return False
+        # 即使 force 也读取缓存，以得到 qstat 是否支持 -F json
+        if self.load() and not force:
+            return False
+        jobs, self.use_json = query_qstat(self.use_json)
+        self.time = time.time()
+        self.jobs = {job_id: {field: attributes.get(key) for field, key in job_fields.items()}
+                     for job_id, attributes in jobs.items()}
+        self.save()
+        return True
+
+    def find_jobs(self, job_ids):
+        short_ids = {short_job_id(job_id): job for job_id, job in self.jobs.items()}
+        return {job_id: self.jobs.get(job_id, short_ids.get(short_job_id(job_id)))
+                for job_id in job_ids}
+
+    def get_jobs(self, job_ids=None):
+        """
+        返回 {任务号: 信息}，job_ids 为 None 时返回所有任务，不在队列中的任务为 None。
+        缓存中找不到指定的任务时强制刷新一次，缓存可能早于这些任务的提交
+        """
+        queried = self.refresh()
+        if job_ids is None:
+            return dict(self.jobs)
+        jobs = self.find_jobs(job_ids)
+        if not queried and any(job is None for job in jobs.values()):
+            self.refresh(force=True)
+            jobs = self.find_jobs(job_ids)
+        return jobs
+
+    def get_state(self, job_id):
+        """
+        返回任务的 job_state (Q/R/H/E/C/...)，不在队列中时返回 None
+        """
+        job = self.get_jobs([job_id])[job_id]
+        return None if job is None else job["state"]
@@ -1,17 +1,35 @@
 #!/usr/bin/env python
 # Standard library imports
+import logging
+import os
+import socket
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from subprocess import run
 
 # Third-party imports
 
 # Application-specific imports
+from hanetoolpy.jobs.jobindex import get_job_state
 from hanetoolpy.jobs.pbsjob import BasePbsJob
+from hanetoolpy.jobs.pbsstatus import queue_alive_states
 from hanetoolpy.utils.config import get_config
 
 config = get_config()
 
 
+def is_process_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
 class BaseVaspJob:
     def __init__(self,
                  vasp_command=config["vasp"]["default_vasp_command"],
@@ -22,18 +40,18 @@ class BaseVaspJob:
         self.ppn = ppn
         self.logfile = "vasp.log"
 
-    def get_command(self):
-        mpi_perfix = f"{self.mpi_command} -n {self.ppn}"
+    def get_command(self, mpi_options=""):
+        mpi_perfix = " ".join(filter(None, [self.mpi_command, mpi_options, f"-n {self.ppn}"]))
         return f"time {mpi_perfix} {self.vasp_command} > {self.logfile}"
 
-    def submit(self):
+    def submit(self, assume_yes=False):
         job = BasePbsJob()
         job.name = "VASP"
         job.ppn = self.ppn
         job.workdir = Path.cwd()
         submit_command = self.get_command()
         job.commands.append(submit_command)
-        job.submit()
+        return job.submit(assume_yes=assume_yes)
 
     def track(self):
         run(f"tail -f {self.logfile}", shell=True)
@@ -43,5 +61,147 @@ class BaseVaspJob:
         run(command, shell=True)
 
 
+class PackedVaspJob(BaseVaspJob):
+    """
+    在一个 PBS 任务中同时运行 parallel 个 VASP 任务，每个使用 ppn 个核。
+    任务目录通过 claim 文件 (O_EXCL 创建) 分配，多个 PackedVaspJob 可同时处理同一批目录。
+    设置 mpi.pin_option 时每个并行位置绑定到不同的核，避免所有 mpirun 都使用前 ppn 个核
+    """
+    claim_name = "hanetoolpy-claim.lock"
+
+    def __init__(self, job_paths, parallel=1, skipfile="SKIP.log",
+                 pin_option=config["mpi"].get("pin_option", ""), **kwargs):
+        super().__init__(**kwargs)
+        self.job_paths = [Path(job_path).resolve() for job_path in job_paths]
+        self.parallel = parallel
+        self.skipfile = skipfile
+        self.pin_option = pin_option
+        self.lock = threading.Lock()
+        self.queue = iter(self.job_paths)
+
+    def claim(self, job_path):
+        """
+        创建 claim 文件，已被其他进程领取时返回 False
+        """
+        try:
+            fd = os.open(job_path / self.claim_name, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            return False
+        with os.fdopen(fd, "w") as file:
+            file.write(f"{socket.gethostname()} {os.environ.get('PBS_JOBID', '')} {os.getpid()}\n")
+        return True
+
+    def release(self, job_path):
+        (job_path / self.claim_name).unlink(missing_ok=True)
+
+    def read_claim(self, job_path):
+        """
+        返回 claim 文件记录的 (主机名, PBS 任务号, 进程号)，文件不存在或无法解析时返回 None
+        """
+        try:
+            fields = (job_path / self.claim_name).read_text().split()
+            return fields[0], fields[1] if len(fields) == 3 else "", int(fields[-1])
+        except (OSError, IndexError, ValueError):
+            return None
+
+    def clear_claims(self):
+        """
+        删除未完成任务中已失效的 claim 文件 (领取它的 PBS 任务已不在队列中，或本机的进程已结束)，
+        用于重新运行被中断的任务，仍在运行的 PackedVaspJob 的 claim 保留
+        """
+        claims = dict()
+        for job_path in self.job_paths:
+            if get_job_state(job_path, self.skipfile) in ("#", "S"):
+                continue
+            claim = self.read_claim(job_path)
+            if claim is not None:
+                claims[job_path] = claim
+        current_jobid = os.environ.get("PBS_JOBID", "")
+        job_ids = {jobid for _, jobid, _ in claims.values() if jobid and jobid != current_jobid}
+        queue_states = dict()
+        if job_ids:
+            from hanetoolpy.jobs.pbsstatus import PbsStatus
+            try:
+                queue_states = {job_id: None if job is None else job["state"]
+                                for job_id, job in PbsStatus(ttl=0).get_jobs(job_ids).items()}
+            except (OSError, RuntimeError) as e:
+                logging.warning(f"Failed to query the claiming jobs, claims kept: {e}")
+                return
+        hostname = socket.gethostname()
+        for job_path, (host, jobid, pid) in claims.items():
+            if jobid and jobid != current_jobid:
+                alive = queue_states.get(jobid) in queue_alive_states
+            elif host == hostname:
+                alive = is_process_alive(pid)
+            else:
+                logging.warning(f"{job_path.name} is claimed by {host} without PBS job, claim kept.")
+                alive = True
+            if not alive:
+                self.release(job_path)
+                logging.info(f"Stale claim of {job_path.name} removed.")
+
+    def next_job(self):
+        """
+        领取下一个未完成、未跳过且未被领取的任务，没有时返回 None
+        """
+        with self.lock:
+            for job_path in self.queue:
+                if get_job_state(job_path, self.skipfile) in ("#", "S"):
+                    continue
+                if self.claim(job_path):
+                    return job_path
+        return None
+
+    def get_pin_options(self, slot):
+        """
+        第 slot 个并行位置的 mpirun 绑核参数，从本进程可用的核中依次划分 ppn 个
+        """
+        if not self.pin_option:
+            return ""
+        cpus = sorted(os.sched_getaffinity(0))
+        if len(cpus) < self.parallel * self.ppn:
+            logging.warning(f"Only {len(cpus)} cores available for {self.parallel} x {self.ppn} cores, "
+                            "VASP jobs are not pinned.")
+            return ""
+        slot_cpus = cpus[slot * self.ppn:(slot + 1) * self.ppn]
+        return self.pin_option.format(cpus=",".join(str(cpu) for cpu in slot_cpus))
+
+    def worker(self, slot=0):
+        count = 0
+        mpi_options = self.get_pin_options(slot)
+        while True:
+            job_path = self.next_job()
+            if job_path is None:
+                return count
+            logging.info(f"{job_path.name} started.")
+            # get_command 中的 time 是 bash 的关键字
+            result = run(["bash", "-c", self.get_command(mpi_options)], cwd=job_path)
+            logging.info(f"{job_path.name} finished with exit code {result.returncode}.")
+            if get_job_state(job_path, self.skipfile) not in ("#", "S"):
+                # 未完成的任务 (失败、超时等) 可以在下次运行时重新领取
+                self.release(job_path)
+            count += 1
+
+    def run(self):
+        with ThreadPoolExecutor(max_workers=self.parallel) as executor:
+            counts = [executor.submit(self.worker, slot) for slot in range(self.parallel)]
+        return sum(count.result() for count in counts)
+
+    def submit(self, workdir, name="VASP-pack", assume_yes=False):
+        """
+        提交一个 PBS 任务，在其中运行 thirdorder pack-worker
+        """
+        job = BasePbsJob()
+        job.name = name
+        job.nodes = 1
+        job.ppn = self.ppn * self.parallel
+        job.workdir = Path(workdir).resolve()
+        worker_command = [sys.executable, "-m", "hanetoolpy.typer.main", "thirdorder", "pack-worker",
+                          "--path", str(job.workdir), "--parallel", str(self.parallel),
+                          "--cores", str(self.ppn), "--skipfile", self.skipfile]
+        job.commands.append(" ".join(worker_command))
+        return job.submit(assume_yes=assume_yes)
+
+
 if __name__ == '__main__':
     print("Finish!")
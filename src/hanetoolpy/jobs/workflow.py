@@ -0,0 +1,178 @@
+#!/usr/bin/env python
+# Standard library imports
+import fcntl
+import json
+import logging
+import os
+import shlex
+import sys
+from contextlib import contextmanager
+from pathlib import Path
+from subprocess import run
+
+# Third-party imports
+
+# Application-specific imports
+from hanetoolpy.jobs.pbsjob import BasePbsJob
+from hanetoolpy.jobs.pbsstatus import queue_alive_states
+
+stage_states = ("pending", "submitted", "done", "failed")
+# 无法查询队列时已提交任务的状态，视为仍在队列中
+queue_unknown = "?"
+
+
+def hnt_command(*args):
+    """
+    用当前的 Python 解释器调用 hnt 子命令，计算节点上不依赖 PATH
+    """
+    return " ".join(shlex.quote(str(arg)) for arg in
+                    [sys.executable, "-m", "hanetoolpy.typer.main", *args])
+
+
+class Workflow:
+    """
+    由若干阶段组成的 DAG，每个阶段是一个 PBS 任务，依赖通过 qsub -W depend=afterok 提交。
+    阶段状态保存在工作目录的 hanetoolpy-workflow.json 中，阶段结束时由任务自己写入 (mark)
+    """
+    file_name = "hanetoolpy-workflow.json"
+    version = 1
+
+    def __init__(self, workdir="./"):
+        self.workdir = Path(workdir).resolve()
+        self.path = self.workdir / self.file_name
+        self.stages = dict()
+        self.load()
+
+    @contextmanager
+    def lock(self):
+        """
+        多个阶段可能同时结束，读写状态文件时加文件锁
+        """
+        with open(self.path.with_name(f"{self.file_name}.lock"), "w") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def load(self):
+        if not self.path.exists():
+            return
+        try:
+            with open(self.path, "r") as file:
+                data = json.load(file)
+        except (OSError, ValueError) as e:
+            logging.warning(f"Failed to read workflow {self.path}: {e}")
+            return
+        if data.get("version") == self.version:
+            self.stages = data.get("stages", dict())
+
+    def save(self):
+        temp_path = self.path.with_name(f"{self.path.name}.{os.getpid()}.tmp")
+        with open(temp_path, "w") as file:
+            json.dump({"version": self.version, "stages": self.stages}, file, indent=2)
+        os.replace(temp_path, self.path)
+
+    def add_stage(self, name, command, depends=(), ppn=1):
+        """
+        添加或更新阶段，命令变化时重置为 pending
+        """
+        stage = self.stages.setdefault(name, {"state": "pending", "jobid": None})
+        if stage.get("command") != command:
+            stage["state"] = "pending"
+        stage.update(command=command, depends=list(depends), ppn=ppn)
+
+    def mark(self, name, state):
+        """
+        记录阶段的状态，由阶段的 PBS 脚本在结束时调用
+        """
+        if state not in stage_states:
+            raise ValueError(f"Unknown stage state: {state}")
+        with self.lock():
+            self.load()
+            if name not in self.stages:
+                raise KeyError(f"No stage {name} in {self.path}")
+            self.stages[name]["state"] = state
+            self.save()
+
+    def get_order(self):
+        """
+        阶段的拓扑顺序，依赖在前
+        """
+        order = []
+        visiting = set()
+
+        def visit(name):
+            if name in order:
+                return
+            if name in visiting:
+                raise ValueError(f"Cyclic dependency at stage {name}")
+            visiting.add(name)
+            for depend in self.stages[name]["depends"]:
+                visit(depend)
+            visiting.discard(name)
+            order.append(name)
+
+        for name in self.stages:
+            visit(name)
+        return order
+
+    def get_script(self, name):
+        stage = self.stages[name]
+        mark = hnt_command("workflow", "mark", "--path", self.workdir, name)
+        return [f"cd {shlex.quote(str(self.workdir))}",
+                f"{stage['command']} && {mark} done || {{ {mark} failed; exit 1; }}"]
+
+    def plan(self, queue_states):
+        """
+        返回需要 (重新) 提交的阶段: 未完成且不在队列中的阶段，以及依赖被重新提交的阶段
+        """
+        resubmit = []
+        for name in self.get_order():
+            stage = self.stages[name]
+            alive = stage["state"] == "submitted" \
+                and queue_states.get(stage["jobid"]) in queue_alive_states + (queue_unknown,)
+            if any(depend in resubmit for depend in stage["depends"]):
+                resubmit.append(name)
+            elif stage["state"] != "done" and not alive:
+                resubmit.append(name)
+        return resubmit
+
+    def submit(self, queue_states, job_options=None):
+        """
+        按拓扑顺序提交 plan 得到的阶段，只依赖仍在队列中或本次提交的阶段，返回提交的阶段
+        """
+        with self.lock():
+            self.load()
+            resubmit = self.plan(queue_states)
+            for name in resubmit:
+                stage = self.stages[name]
+                old_jobid = stage.get("jobid")
+                if old_jobid and queue_states.get(old_jobid) in queue_alive_states + (queue_unknown,):
+                    try:
+                        run(["qdel", old_jobid], capture_output=True)
+                    except FileNotFoundError as e:
+                        logging.warning(f"Failed to cancel {old_jobid} of stage {name}: {e}")
+                depend_ids = [self.stages[depend]["jobid"] for depend in stage["depends"]
+                              if self.stages[depend]["state"] != "done" or depend in resubmit]
+                job = BasePbsJob(**(job_options or dict()))
+                job.name = f"wf-{name}"
+                job.workdir = self.workdir
+                job.nodes = 1
+                job.ppn = stage["ppn"]
+                job.commands = self.get_script(name)
+                if depend_ids:
+                    job.depend = "afterok:" + ":".join(depend_ids)
+                job.write_script()
+                try:
+                    jobid = job.qsub()
+                finally:
+                    # qsub 已复制脚本，删除以免每次重新提交都留下 wf-*.pbs
+                    os.remove(job.file)
+                if jobid is None:
+                    raise RuntimeError(f"Failed to get the job ID of stage {name}.")
+                stage["jobid"] = jobid
+                stage["state"] = "submitted"
+                self.save()
+                logging.info(f"Stage {name} submitted as {jobid}.")
+        return resubmit
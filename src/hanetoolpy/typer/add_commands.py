@@ -1,92 +1,85 @@
 import typer
 
+from hanetoolpy.typer.lazy_group import lazy_command, lazy_group
+
 
 def add_commands(parent):
+    # 子命令只在调用时导入，见 LazyGroup
     # 添加 vasp 命令
-    vasp = typer.Typer(no_args_is_help=True,
-                       invoke_without_command=True)
+    vasp = typer.Typer(cls=lazy_group({
+        "run": lazy_command("hanetoolpy.functions.vasp_run:vasp_run"),
+        "check_end": lazy_command("hanetoolpy.functions.vasp:check_vasp_end"),
+        "bandedge": lazy_command("hanetoolpy.functions.vasp:get_band_info"),
+        "stop": lazy_command("hanetoolpy.functions.vasp_stop:vasp_stop", no_args_is_help=True),
+        "f101": lazy_command("hanetoolpy.functions.global_band_plotter:plot"),
+        "f102": lazy_command("hanetoolpy.functions.ebs_unfold_plotter:main"),
+    }), no_args_is_help=True, invoke_without_command=True)
     parent.add_typer(vasp, name="vasp", help="VASP tools")
 
-    # 添加 vasp 子命令
-    from hanetoolpy.functions.vasp_run import vasp_run
-    vasp.command("run")(vasp_run)
-    from hanetoolpy.functions.vasp import check_vasp_end, get_band_info
-    vasp.command("check_end")(check_vasp_end)
-    vasp.command("bandedge")(get_band_info)
-    from hanetoolpy.functions.vasp_stop import vasp_stop
-    vasp.command("stop", no_args_is_help=True)(vasp_stop)
-    from hanetoolpy.functions.global_band_plotter import plot as f101
-    vasp.command("f101")(f101)
-    from hanetoolpy.functions.ebs_unfold_plotter import main as f102
-    vasp.command("f102")(f102)
-
     # 添加 vaspkit 命令
-    vaspkit = typer.Typer(no_args_is_help=True,
-                          invoke_without_command=True)
+    vaspkit = typer.Typer(cls=lazy_group({
+        "f281": lazy_command("hanetoolpy.functions.vaspkit:vaspkit_281"),
+    }), no_args_is_help=True, invoke_without_command=True)
     parent.add_typer(vaspkit, name="vaspkit", help="VASPKIT tools")
 
-    # 添加 vaspkit 子命令
-    from hanetoolpy.functions.vaspkit import vaspkit_281
-    vaspkit.command("f281")(vaspkit_281)
-
     # 添加 thirdorder 命令
-    thirdorder = typer.Typer(no_args_is_help=True,
-                             invoke_without_command=True)
+    thirdorder_functions = ("hanetoolpy.functions.thirdorder_vasp_repackage",
+                            "hanetoolpy.functions.thirdorder_repost")
+    thirdorder = typer.Typer(cls=lazy_group({
+        "sow": lazy_command([f"{module}:sow" for module in thirdorder_functions],
+                            rich_help_panel="Main"),
+        "reap": lazy_command([f"{module}:reap" for module in thirdorder_functions],
+                             rich_help_panel="Main"),
+        "submit": lazy_command("hanetoolpy.functions.thirdorder:submit_array_jobs",
+                               rich_help_panel="Main"),
+        "pack": lazy_command("hanetoolpy.functions.thirdorder:pack_jobs", rich_help_panel="Main"),
+        "pack-worker": lazy_command("hanetoolpy.functions.thirdorder:pack_worker", hidden=True),
+        "check": lazy_command("hanetoolpy.functions.thirdorder:check_thirdorder_jobs",
+                              rich_help_panel="Tools"),
+        "reduce": lazy_command("hanetoolpy.functions.thirdorder_symmetry:reduce_displacements",
+                               rich_help_panel="Tools"),
+        "expand": lazy_command("hanetoolpy.functions.thirdorder_symmetry:expand_displacements",
+                               rich_help_panel="Tools"),
+        "collect": lazy_command("hanetoolpy.functions.thirdorder_native:collect_forces",
+                                rich_help_panel="Tools"),
+        "rms": lazy_command("hanetoolpy.functions.rms:rms_3rd", rich_help_panel="Tools"),
+        "f101": lazy_command("hanetoolpy.functions.thirdorder:organize_files",
+                             rich_help_panel="Others"),
+        "f102": lazy_command("hanetoolpy.functions.thirdorder:check_duplicates",
+                             rich_help_panel="Others"),
+        "f103": lazy_command("hanetoolpy.functions.thirdorder:get_order_distance",
+                             rich_help_panel="Others"),
+    }), no_args_is_help=True, invoke_without_command=True)
     parent.add_typer(thirdorder, name="thirdorder", help="thirdorder tools")
 
-    # 添加 thirdorder 子命令
-    try:
-        from hanetoolpy.functions.thirdorder_vasp_repackage import sow, reap
-    except ModuleNotFoundError as e:
-        from hanetoolpy.functions.thirdorder_repost import sow, reap
-    finally:
-        thirdorder.command("sow", rich_help_panel="Main")(sow)
-        thirdorder.command("reap", rich_help_panel="Main")(reap)
-
-    from hanetoolpy.functions.thirdorder \
-        import check_thirdorder_jobs as thirdorder_check
-    thirdorder.command("check", rich_help_panel="Tools")(thirdorder_check)
-
-    from hanetoolpy.functions.thirdorder \
-        import organize_files as thirdorder_f101
-    thirdorder.command("f101", rich_help_panel="Others")(thirdorder_f101)
-
-    from hanetoolpy.functions.thirdorder \
-        import check_duplicates as thirdorder_f102
-    thirdorder.command("f102", rich_help_panel="Others")(thirdorder_f102)
-
-    from hanetoolpy.functions.thirdorder \
-        import get_order_distance as thirdorder_f103
-    thirdorder.command("f103", rich_help_panel="Others")(thirdorder_f103)
-
     # phonopy
-    phonopy = typer.Typer(no_args_is_help=True,
-                          invoke_without_command=True)
+    phonopy = typer.Typer(cls=lazy_group({
+        "rms": lazy_command("hanetoolpy.functions.rms:rms"),
+    }), no_args_is_help=True, invoke_without_command=True)
     parent.add_typer(phonopy, name="phonopy", help="phonopy tools")
 
-    # phonopy 子命令
-    from hanetoolpy.functions.rms import rms as rms
-    phonopy.command("rms")(rms)
-
     # pbs 主命令
-    pbs = typer.Typer(no_args_is_help=True,
-                      invoke_without_command=True)
+    pbs = typer.Typer(cls=lazy_group({
+        "runsh": lazy_command("hanetoolpy.functions.pbs_run:run_sh_with_pbs"),
+        "runpy": lazy_command("hanetoolpy.functions.pbs_run:run_py_with_pbs"),
+        "status": lazy_command("hanetoolpy.functions.pbs_run:pbs_status"),
+    }), no_args_is_help=True, invoke_without_command=True)
     parent.add_typer(pbs, name="pbs", help="PBS tools")
 
-    # pbs 子命令
-    from hanetoolpy.functions.pbs_run import run_sh_with_pbs, run_py_with_pbs
-    pbs.command("runsh")(run_sh_with_pbs)
-    pbs.command("runpy")(run_py_with_pbs)
-
     # shengbte 主命令
-    shengbte = typer.Typer(no_args_is_help=True,
-                      invoke_without_command=True)
+    shengbte = typer.Typer(cls=lazy_group({
+        "run": lazy_command("hanetoolpy.functions.shengbte:shengbte_run"),
+        "control": lazy_command("hanetoolpy.functions.shengbte:poscar_to_control"),
+    }), no_args_is_help=True, invoke_without_command=True)
     parent.add_typer(shengbte, name="shengbte", help="ShengBTE tools")
 
-    # shengbte 子命令
-    from hanetoolpy.functions.shengbte import shengbte_run, poscar_to_control
-    shengbte.command("run")(shengbte_run)
-    shengbte.command("control")(poscar_to_control)
+    # workflow 主命令
+    workflow = typer.Typer(cls=lazy_group({
+        "run": lazy_command("hanetoolpy.functions.workflow:workflow_run"),
+        "status": lazy_command("hanetoolpy.functions.workflow:workflow_status"),
+        "mark": lazy_command("hanetoolpy.functions.workflow:workflow_mark"),
+    }), no_args_is_help=True, invoke_without_command=True)
+    parent.add_typer(workflow, name="workflow", help="PBS workflow tools")
 
     # # test
     # test = typer.Typer(
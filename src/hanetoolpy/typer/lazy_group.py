@@ -0,0 +1,61 @@
+import importlib
+
+import typer
+from typer.core import TyperGroup
+
+
+def lazy_command(target, **kwargs):
+    """
+    延迟注册的命令: target 为 "module:function"，或按顺序尝试的多个备选，
+    kwargs 传给 Typer.command
+    """
+    return target, kwargs
+
+
+def load_function(target):
+    """
+    导入 "module:function"，target 为元组时依次尝试，模块不存在时使用下一个
+    """
+    targets = (target,) if isinstance(target, str) else tuple(target)
+    for i, item in enumerate(targets):
+        module_name, function_name = item.split(":")
+        try:
+            module = importlib.import_module(module_name)
+        except ModuleNotFoundError:
+            if i == len(targets) - 1:
+                raise
+            continue
+        return getattr(module, function_name)
+
+
+def load_command(name, target, kwargs):
+    """
+    导入函数并生成与 Typer.command 注册相同的 click 命令
+    """
+    app = typer.Typer()
+    app.command(name, **kwargs)(load_function(target))
+    return typer.main.get_command(app)
+
+
+class LazyGroup(TyperGroup):
+    """
+    子命令在被调用 (或显示帮助) 时才导入对应的模块，
+    避免启动时导入 matplotlib、pandas 等
+    """
+    lazy_commands = dict()
+
+    def list_commands(self, ctx):
+        names = super().list_commands(ctx)
+        return names + [name for name in self.lazy_commands if name not in names]
+
+    def get_command(self, ctx, name):
+        if name not in self.commands and name in self.lazy_commands:
+            self.commands[name] = load_command(name, *self.lazy_commands[name])
+        return super().get_command(ctx, name)
+
+
+def lazy_group(commands):
+    """
+    返回以 commands ({名称: lazy_command(...)}) 为子命令的 LazyGroup 子类，用作 Typer 的 cls
+    """
+    return type("LazyGroup", (LazyGroup,), {"lazy_commands": dict(commands)})
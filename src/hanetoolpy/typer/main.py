@@ -3,7 +3,6 @@ import time
 from pathlib import Path
 
 import typer
-from hanetoolpy.about import __version__
 from hanetoolpy.typer.add_commands import add_commands
 from rich.logging import RichHandler
 from typing_extensions import Annotated
@@ -39,6 +38,7 @@ def main(context: typer.Context,
     TODO: Introduction text.
     """
     if version:  # -version -v 显示程序版本
+        from hanetoolpy.about import __version__
         print(__version__)
     elif whereis:
         print(package_root)
@@ -0,0 +1,122 @@
+#!/usr/bin/env python
+# Standard library imports
+import hashlib
+import json
+import logging
+import os
+from pathlib import Path
+
+# Third-party imports
+import numpy as np
+
+# Application-specific imports
+
+cache_dir_name = ".hanetoolpy_cache"
+cache_version = 1
+
+
+def get_stamp(path, key="") -> str:
+    """
+    根据文件的大小和修改时间 (以及额外的 key) 生成缓存标识
+    """
+    stat = Path(path).stat()
+    text = f"{cache_version}:{stat.st_size}:{stat.st_mtime_ns}:{key}"
+    return hashlib.sha1(text.encode()).hexdigest()
+
+
+def get_cache_path(path, name, suffix=".npz") -> Path:
+    """
+    缓存文件位于输入文件同目录的 .hanetoolpy_cache/ 中
+    """
+    path = Path(path).resolve()
+    return path.parent / cache_dir_name / f"{path.name}.{name}{suffix}"
+
+
+def load_cache(path, name, stamp):
+    """
+    读取缓存，缓存不存在或已过期时返回 None
+    """
+    cache_path = get_cache_path(path, name)
+    if not cache_path.exists():
+        return None
+    try:
+        with np.load(cache_path, allow_pickle=False) as data:
+            if str(data["stamp"]) != stamp:
+                return None
+            return {key: data[key] for key in data.files if key != "stamp"}
+    except (OSError, ValueError, KeyError) as e:
+        logging.debug(f"Ignore broken cache {cache_path}: {e}")
+        return None
+
+
+def save_cache(path, name, stamp, **arrays):
+    """
+    写入缓存，目录不可写时只给出警告
+    """
+    cache_path = get_cache_path(path, name)
+    temp_path = cache_path.with_name(f"{cache_path.name}.{os.getpid()}.tmp")
+    try:
+        cache_path.parent.mkdir(exist_ok=True)
+        with open(temp_path, "wb") as file:
+            np.savez(file, stamp=stamp, **arrays)
+        os.replace(temp_path, cache_path)
+    except OSError as e:
+        logging.warning(f"Failed to write cache {cache_path}: {e}")
+
+
+def load_memmap_cache(path, name, stamp):
+    """
+    以只读内存映射的方式读取 .npy 缓存，缓存不存在、未写完或已过期时返回 None
+    """
+    meta_path = get_cache_path(path, name, ".json")
+    if not meta_path.exists():
+        return None
+    try:
+        with open(meta_path, "r") as file:
+            meta = json.load(file)
+        if meta.get("stamp") != stamp:
+            return None
+        return {key: np.load(get_cache_path(path, f"{name}.{key}", ".npy"), mmap_mode="r")
+                for key in meta["keys"]}
+    except (OSError, ValueError, KeyError) as e:
+        logging.debug(f"Ignore broken cache {meta_path}: {e}")
+        return None
+
+
+def open_memmap_cache(path, name, shapes):
+    """
+    为每个 key -> (shape, dtype) 创建可写的 .npy 内存映射，
+    目录不可写时只给出警告并改用内存中的数组。
+    写完后需调用 commit_memmap_cache
+    """
+    from numpy.lib.format import open_memmap
+    meta_path = get_cache_path(path, name, ".json")
+    try:
+        meta_path.parent.mkdir(exist_ok=True)
+        # 先删除旧的标识，写到一半中断时缓存视为无效
+        if meta_path.exists():
+            meta_path.unlink()
+        return {key: open_memmap(get_cache_path(path, f"{name}.{key}", ".npy"),
+                                 mode="w+", dtype=dtype, shape=shape)
+                for key, (shape, dtype) in shapes.items()}
+    except OSError as e:
+        logging.warning(f"Failed to write cache {meta_path}: {e}")
+        return {key: np.empty(shape, dtype=dtype) for key, (shape, dtype) in shapes.items()}
+
+
+def commit_memmap_cache(path, name, stamp, arrays):
+    """
+    写入缓存标识，之后 load_memmap_cache 才会使用这些 .npy 文件
+    """
+    if not all(isinstance(array, np.memmap) for array in arrays.values()):
+        return
+    meta_path = get_cache_path(path, name, ".json")
+    temp_path = meta_path.with_name(f"{meta_path.name}.{os.getpid()}.tmp")
+    try:
+        for array in arrays.values():
+            array.flush()
+        with open(temp_path, "w") as file:
+            json.dump({"stamp": stamp, "keys": list(arrays)}, file)
+        os.replace(temp_path, meta_path)
+    except OSError as e:
+        logging.warning(f"Failed to write cache {meta_path}: {e}")
@@ -1,5 +1,6 @@
 #!/usr/bin/env python
 # Standard library imports
+import os
 from pathlib import Path
 # Third-party imports
 import toml
@@ -22,37 +23,65 @@ class ConfigLoader:
     def __init__(self):
         current_file_path = Path(__file__).resolve()
         package_root = current_file_path.parent.parent
-        default_config_path = package_root / 'hanetoolpy.default.config.toml'
-        custom_config_path = package_root / 'hanetoolpy.custom.config.toml'
-        develop_config_path = package_root / 'hanetoolpy.develop.config.toml'
-        project_config_path = Path('./hanetoolpy.config.toml').resolve()
-        # 读取默认设置
-        with open(default_config_path, 'r') as file:
-            default_config = toml.load(file)
-            self.config = default_config.copy()
-        # 读取自定义设置
-        if custom_config_path.exists():
-            with open(custom_config_path, 'r') as file:
-                custom_config = toml.load(file)
-                self.config = merge_dict(self.config, custom_config)
-        else:
-            custom_config_path.touch()
-        # 读取开发用设置
-        if develop_config_path.exists():
-            with open(develop_config_path, 'r') as file:
-                custom_config = toml.load(file)
-                self.config = merge_dict(self.config, custom_config)
-        # 读取当前路径设置
-        if project_config_path.exists():
-            with open(project_config_path, 'r') as file:
-                custom_config = toml.load(file)
-                self.config = merge_dict(self.config, custom_config)
+        # 按优先级从低到高: 默认、自定义、开发用、当前路径设置
+        self.paths = [package_root / 'hanetoolpy.default.config.toml',
+                      package_root / 'hanetoolpy.custom.config.toml',
+                      package_root / 'hanetoolpy.develop.config.toml',
+                      Path('./hanetoolpy.config.toml').resolve()]
+        self.stamp = self.get_stamp()
+        self.config = self.load()
+
+    def get_stamp(self):
+        """
+        各设置文件的 (修改时间, 大小)，不存在时为 None，只需 stat 不读取文件
+        """
+        stamp = []
+        for path in self.paths:
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                stamp.append(None)
+            else:
+                stamp.append((stat.st_mtime_ns, stat.st_size))
+        return tuple(stamp)
+
+    def load(self):
+        """
+        依次读取存在的设置文件并合并，不会创建或修改任何文件
+        """
+        config = dict()
+        for path, stamp in zip(self.paths, self.stamp):
+            if stamp is None:
+                continue
+            with open(path, 'r') as file:
+                config = merge_dict(config, toml.load(file))
+        return config
+
+    def is_outdated(self):
+        return Path('./hanetoolpy.config.toml').resolve() != self.paths[-1] \
+            or self.get_stamp() != self.stamp
+
+
+_config_loader = None
 
 
 def get_config():
-    config_loader = ConfigLoader()
-    config = config_loader.config
-    return config
+    """
+    返回进程内共享的设置 (不要修改)，设置文件或当前路径变化时重新读取
+    """
+    global _config_loader
+    if _config_loader is None or _config_loader.is_outdated():
+        _config_loader = ConfigLoader()
+    return _config_loader.config
+
+
+def reload_config():
+    """
+    丢弃缓存，重新读取所有设置文件
+    """
+    global _config_loader
+    _config_loader = ConfigLoader()
+    return _config_loader.config
 
 
 if __name__ == '__main__':
@@ -0,0 +1,76 @@
+#!/usr/bin/env python
+# Standard library imports
+import itertools
+
+# Third-party imports
+import numpy as np
+
+# Application-specific imports
+
+# 27 个相邻晶胞的平移，顺序与 thirdorder 的 calc_dists 相同
+image_shifts = np.array(list(itertools.product(range(-1, 2), repeat=3)))
+default_chunk_bytes = 2 ** 26
+
+
+def get_chunk_size(n_columns, chunk_bytes=default_chunk_bytes):
+    """
+    每块处理的行数，使单块的 (行, 列, 3) 数组不超过 chunk_bytes
+    """
+    return max(1, int(chunk_bytes // (max(1, n_columns) * 3 * 8)))
+
+
+def get_min_image_vectors(lattice, frac_diff):
+    """
+    返回分数坐标差 frac_diff (..., 3) 在最近镜像下的笛卡尔矢量和距离。
+    先将各分量移入 [-0.5, 0.5]，再比较 27 个相邻镜像，适用于非正交晶胞
+    """
+    lattice = np.asarray(lattice, dtype=float)
+    frac_diff = np.asarray(frac_diff, dtype=float)
+    cart = (frac_diff - np.rint(frac_diff)) @ lattice
+    image_cart = image_shifts @ lattice
+    best = np.einsum("...i,...i->...", cart, cart)
+    best_image = np.full(best.shape, 13)  # image_shifts[13] == (0, 0, 0)
+    for i, shift in enumerate(image_cart):
+        if i == 13:
+            continue
+        d2 = np.einsum("...i,...i->...", cart + shift, cart + shift)
+        better = d2 < best
+        best = np.where(better, d2, best)
+        best_image = np.where(better, i, best_image)
+    vectors = cart + image_cart[best_image]
+    return vectors, np.sqrt(best)
+
+
+def get_min_image_distances(lattice, positions_a, positions_b=None,
+                            chunk_bytes=default_chunk_bytes):
+    """
+    所有原子对的最近镜像距离矩阵 (na, nb)。
+    lattice 的每行为一个晶格矢量，positions 为分数坐标，按行分块计算以限制内存
+    """
+    positions_a = np.atleast_2d(np.asarray(positions_a, dtype=float))
+    positions_b = positions_a if positions_b is None \
+        else np.atleast_2d(np.asarray(positions_b, dtype=float))
+    distances = np.empty((len(positions_a), len(positions_b)))
+    chunk_size = get_chunk_size(len(positions_b), chunk_bytes)
+    for start in range(0, len(positions_a), chunk_size):
+        stop = start + chunk_size
+        frac_diff = positions_b[np.newaxis, :, :] - positions_a[start:stop, np.newaxis, :]
+        distances[start:stop] = get_min_image_vectors(lattice, frac_diff)[1]
+    return distances
+
+
+def get_pair_distances(lattice, positions, atom_a, atom_b,
+                       chunk_bytes=default_chunk_bytes):
+    """
+    原子对 (atom_a[k], atom_b[k]) 的最近镜像距离，atom_a/atom_b 为从 0 开始的序号
+    """
+    positions = np.asarray(positions, dtype=float)
+    atom_a = np.asarray(atom_a).ravel()
+    atom_b = np.asarray(atom_b).ravel()
+    distances = np.empty(len(atom_a))
+    chunk_size = get_chunk_size(1, chunk_bytes)
+    for start in range(0, len(atom_a), chunk_size):
+        stop = start + chunk_size
+        frac_diff = positions[atom_b[start:stop]] - positions[atom_a[start:stop]]
+        distances[start:stop] = get_min_image_vectors(lattice, frac_diff)[1]
+    return distances
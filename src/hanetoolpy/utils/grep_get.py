@@ -1,6 +1,68 @@
+import os
+
+import numpy as np
+
+
 def grep_get(path, text: str, order: int):
     with open(path, "r") as file:
         lines = file.readlines()
         for line in lines:
             if text in line:
                 return line.split()[order]
+
+
+def reverse_readlines(path, block_size=4096, max_bytes=None):
+    """
+    从文件末尾开始按块倒序读取各行，max_bytes 限制最多读取的字节数
+    """
+    with open(path, "rb") as file:
+        file.seek(0, os.SEEK_END)
+        position = file.tell()
+        limit = 0 if max_bytes is None else max(0, position - max_bytes)
+        remainder = b""
+        while position > limit:
+            size = min(block_size, position - limit)
+            position -= size
+            file.seek(position)
+            lines = (file.read(size) + remainder).split(b"\n")
+            # 第一段可能不完整，留到下一块拼接
+            remainder = lines[0]
+            for line in reversed(lines[1:]):
+                yield line.decode(errors="replace")
+        if limit == 0:
+            yield remainder.decode(errors="replace")
+
+
+def grep_last(path, text: str, block_size=4096, max_bytes=None):
+    """
+    返回文件中最后一个包含 text 的行，找不到时返回 None
+    """
+    for line in reverse_readlines(path, block_size=block_size, max_bytes=max_bytes):
+        if text in line:
+            return line
+    return None
+
+
+def iter_token_blocks(file, block_tokens, chunk_bytes=2 ** 22):
+    """
+    从已打开的文本文件中分块读取数值，每 block_tokens 个数为一组，
+    每次产出形状为 (m, block_tokens) 的数组，内存占用与文件大小无关
+    """
+    tail = ""
+    values = np.empty(0)
+    while True:
+        chunk = file.read(chunk_bytes)
+        text = tail + chunk
+        if chunk:
+            # 块末尾可能是不完整的数，留到下一块
+            cut = len(text.rstrip("0123456789.+-eE"))
+            text, tail = text[:cut], text[cut:]
+        values = np.concatenate([values, np.fromstring(text, sep=" ")])
+        n_blocks = len(values) // block_tokens
+        if n_blocks > 0:
+            yield values[:n_blocks * block_tokens].reshape(n_blocks, block_tokens)
+            values = values[n_blocks * block_tokens:]
+        if not chunk:
+            break
+    if len(values) > 0:
+        raise ValueError(f"Incomplete block at the end of {file.name}")
@@ -0,0 +1,34 @@
+#!/usr/bin/env python
+# Standard library imports
+from functools import lru_cache
+
+# Third-party imports
+
+# Application-specific imports
+
+default_font_names = ("Times New Roman",)
+
+
+@lru_cache(maxsize=None)
+def find_fonts(font_names=default_font_names):
+    """
+    返回 font_names 中 matplotlib 可用的字体族名，比较的是字体族名而不是文件路径。
+    字体列表由 matplotlib 自己的 fontManager 缓存
+    """
+    from matplotlib import font_manager
+    families = {font.name for font in font_manager.fontManager.ttflist}
+    return tuple(name for name in font_names if name in families)
+
+
+def apply_style(font_size=None, font_names=default_font_names):
+    """
+    统一设置绘图样式: 可用时使用 font_names 中的第一个字体，数学公式使用 cm 字体
+    """
+    import matplotlib.pyplot as plt
+    fonts = find_fonts(tuple(font_names))
+    if fonts:
+        plt.rcParams["font.family"] = fonts[0]
+    config = {"mathtext.fontset": "cm"}
+    if font_size is not None:
+        config["font.size"] = font_size
+    plt.rcParams.update(config)
@@ -1,17 +1,28 @@
 from pathlib import Path
 
+import numpy as np
 import pandas as pd
 from rich import print
 from rich.table import Table
 
+from hanetoolpy.utils.cache import get_stamp, load_cache, save_cache
+
 
 class Eigenval:
-    def __init__(self, path=".", soc=False):
+    def __init__(self, path=".", soc=False, cache=True):
         self.path = self.get_path(path)
         self.index_VB = None
         self.index_CB = None
-        self.df = None
+        self.n_spin = 1
+        self.n_electrons = None
+        self.kpoints = None  # (n_kpoints, 4): k_a, k_b, k_c, weight
+        self.energies = None  # (n_spin, n_kpoints, n_bands)
+        self.occupations = None  # (n_spin, n_kpoints, n_bands)，旧版 EIGENVAL 中为 None
+        self.vbm = None  # (spin, kpoint, band)
+        self.cbm = None
+        self._df = None
         self.soc = soc
+        self.cache = cache
         self.read()
         self.info = self.get_info()
 
@@ -31,65 +42,166 @@ class Eigenval:
         print(table)
 
     def read(self):
+        if self.cache:
+            stamp = get_stamp(self.path)
+            data = load_cache(self.path, "eigenval", stamp)
+            if data is None:
+                data = self.parse()
+                save_cache(self.path, "eigenval", stamp, **data)
+        else:
+            data = self.parse()
+        self.n_spin = int(data["n_spin"])
+        self.n_electrons = int(data["n_electrons"])
+        self.kpoints = data["kpoints"]
+        self.energies = data["energies"]
+        self.occupations = data.get("occupations")
+        self._df = None
+        self.find_band_edges()
+
+    def parse(self) -> dict:
+        """
+        解析 EIGENVAL 文件，返回由数组组成的词典
+        """
         header_num = 7
         with open(self.path, "r") as file:
-            datalines = file.read().splitlines()
-        band_info = datalines[5].split()
+            header = [file.readline() for _ in range(header_num)]
+            maindata = file.read()
+        n_spin = int(header[0].split()[3])
+        band_info = header[5].split()
         n_electrons = int(band_info[0])
         n_kpoints = int(band_info[1])
         n_bands = int(band_info[2])
-        n_loop = n_bands + 2  # 每一组数据的行数 = k点行+能带数+空行
+        # 能带行的列数 (序号, 各自旋能量, [各自旋占据数])
+        n_columns = len(maindata.split("\n", 2)[1].split())
+        # 一次性转换全部数据，每个 k 点 = k点行(4 个数) + 能带数 * 列数
+        values = np.fromstring(maindata, sep=" ")
+        values = values[:n_kpoints * (4 + n_bands * n_columns)]
+        values = values.reshape(n_kpoints, 4 + n_bands * n_columns)
+        bands = values[:, 4:].reshape(n_kpoints, n_bands, n_columns)
+        data = {
+            "n_spin": n_spin,
+            "n_electrons": n_electrons,
+            "kpoints": values[:, :4].copy(),
+            "energies": bands[:, :, 1:1 + n_spin].transpose(2, 0, 1).copy(),
+        }
+        if n_columns == 1 + 2 * n_spin:
+            data["occupations"] = bands[:, :, 1 + n_spin:].transpose(2, 0, 1).copy()
+        return data
+
+    def get_occupied(self):
+        """
+        返回 (n_spin, n_kpoints, n_bands) 的布尔数组，表示各状态是否被占据
+        """
+        if self.occupations is not None:
+            return self.occupations > 0.5
+        # 旧版 EIGENVAL 没有占据数，按电子数估计
+        n_spin, n_kpoints, n_bands = self.energies.shape
+        if n_spin == 2:
+            # 自旋极化时每个态只占据一个电子，两个自旋通道的占据数不一定相同，
+            # 在每个 k 点将两个通道的态合在一起，能量最低的 n_electrons 个态被占据
+            energies = self.energies.transpose(1, 0, 2).reshape(n_kpoints, n_spin * n_bands)
+            ranks = np.argsort(np.argsort(energies, axis=1, kind="stable"), axis=1)
+            occupied = ranks < int(self.n_electrons)
+            return occupied.reshape(n_kpoints, n_spin, n_bands).transpose(1, 0, 2)
         if self.soc:
-            self.index_VB = int(n_electrons)
+            n_occupied = int(self.n_electrons)
         else:
-            self.index_VB = int(n_electrons / 2)
-        self.index_CB = int(self.index_VB + 1)
-        maindata = datalines[header_num:]
-        data = []
-        for kpoint_index in range(n_kpoints):
-            kpoint_line_index = kpoint_index * n_loop
-            kpoint_data = [float(string) for string in maindata[kpoint_line_index].split()]
-            k_a, k_b, k_c = kpoint_data[:3]
-            weight = kpoint_data[3]
-            for band_index in range(n_bands):  # 从 0 开始
-                band_line_index = kpoint_line_index + 1 + band_index  # maindata 中的行号
-                energy = [float(string) for string in maindata[band_line_index].split()][1]
-                data.append([k_a, k_b, k_c, weight, band_index, energy])
-        self.df = pd.DataFrame(
-            data, columns=["k_a", "k_b", "k_c", "weight", "band_index", "energy"])
-        self.df['band_index'] = self.df['band_index'].astype(int)
-
-    def get_band(self, index, simple=False):
+            n_occupied = int(self.n_electrons / 2)
+        return np.broadcast_to(np.arange(n_bands) < n_occupied, self.energies.shape)
+
+    def find_band_edges(self):
+        """
+        根据占据情况找出 VBM 和 CBM 所在的 (自旋, k点, 能带)
+        """
+        occupied = self.get_occupied()
+        vb_energies = np.where(occupied, self.energies, -np.inf)
+        cb_energies = np.where(occupied, np.inf, self.energies)
+        self.vbm = np.unravel_index(np.argmax(vb_energies), vb_energies.shape)
+        self.cbm = np.unravel_index(np.argmin(cb_energies), cb_energies.shape)
+        # 以 VBM/CBM 所在 k 点的占据能带数作为能带序号 (从 1 开始)
+        self.index_VB = int(occupied[self.vbm[0], self.vbm[1]].sum())
+        self.index_CB = int(occupied[self.cbm[0], self.cbm[1]].sum()) + 1
+        return self.vbm, self.cbm
+
+    @property
+    def df(self):
+        """长格式的 DataFrame，仅在首次访问时生成"""
+        if self._df is None:
+            n_spin, n_kpoints, n_bands = self.energies.shape
+            data = {
+                "k_a": np.tile(np.repeat(self.kpoints[:, 0], n_bands), n_spin),
+                "k_b": np.tile(np.repeat(self.kpoints[:, 1], n_bands), n_spin),
+                "k_c": np.tile(np.repeat(self.kpoints[:, 2], n_bands), n_spin),
+                "weight": np.tile(np.repeat(self.kpoints[:, 3], n_bands), n_spin),
+            }
+            if n_spin == 2:
+                data["spin"] = np.repeat(np.arange(n_spin), n_kpoints * n_bands)
+            data["band_index"] = np.tile(np.arange(n_bands), n_spin * n_kpoints)
+            data["energy"] = self.energies.ravel()
+            if self.occupations is not None:
+                data["occupation"] = self.occupations.ravel()
+            self._df = pd.DataFrame(data)
+        return self._df
+
+    def get_band(self, index, simple=False, spin=None):
+        """
+        返回第 index 条能带；spin 为 None 时 VB/CB 取带边所在的自旋通道
+        """
         if index == "VB":
             index = self.index_VB
+            spin = self.vbm[0] if spin is None else spin
         elif index == "CB":
             index = self.index_CB
-        band_data = self.df[self.df["band_index"] == int(index) - 1]
+            spin = self.cbm[0] if spin is None else spin
+        spin = 0 if spin is None else int(spin)
+        band_index = int(index) - 1
+        n_spin, n_kpoints, n_bands = self.energies.shape
+        data = {
+            "k_a": self.kpoints[:, 0],
+            "k_b": self.kpoints[:, 1],
+            "k_c": self.kpoints[:, 2],
+            "weight": self.kpoints[:, 3],
+        }
+        if n_spin == 2:
+            data["spin"] = spin
+        data["band_index"] = band_index
+        data["energy"] = self.energies[spin, :, band_index]
+        if self.occupations is not None:
+            data["occupation"] = self.occupations[spin, :, band_index]
+        offset = (spin * n_kpoints) * n_bands + band_index
+        band_data = pd.DataFrame(data, index=np.arange(n_kpoints) * n_bands + offset)
         if not simple:
             return band_data
         else:
             return band_data.loc[:, ["k_a", "k_b", "energy"]]
 
     def get_info(self, detail=False) -> dict:
-        df = self.df
-        line_vbm = df[df['band_index'] == self.index_VB - 1].nlargest(1, 'energy')
-        line_cbm = df[df['band_index'] == self.index_CB - 1].nsmallest(1, 'energy')
+        spin_vbm, k_vbm, band_vbm = self.vbm
+        spin_cbm, k_cbm, band_cbm = self.cbm
         data = {
             "VB_index": self.index_VB,
             "CB_index": self.index_CB,
-            "VBM_energy": float(line_vbm["energy"].iloc[0]),
-            "CBM_energy": float(line_cbm["energy"].iloc[0]),
-            "VBM_kabc": line_vbm[["k_a", "k_b", "k_c"]].values.flatten().tolist(),
-            "CBM_kabc": line_cbm[["k_a", "k_b", "k_c"]].values.flatten().tolist(),
+            "VBM_energy": float(self.energies[self.vbm]),
+            "CBM_energy": float(self.energies[self.cbm]),
+            "VBM_kabc": self.kpoints[k_vbm, :3].tolist(),
+            "CBM_kabc": self.kpoints[k_cbm, :3].tolist(),
         }
+        if self.n_spin == 2:
+            spin_names = ("up", "down")
+            data["VBM_spin"] = spin_names[spin_vbm]
+            data["CBM_spin"] = spin_names[spin_cbm]
         if detail == True:
             data.update({
                 "folder_name": str(self.path.parent.name),
                 "input_path": str(self.path),
                 "absolute_path": str(Path(self.path).resolve()),
             })
-        data["gap_type"] = "Direct" if (data["VBM_kabc"] == data["CBM_kabc"]) else "Indirect"
-        data["gap_energy"] = round(data["CBM_energy"] - data["VBM_energy"], 10)
+        if data["CBM_energy"] <= data["VBM_energy"]:
+            data["gap_type"] = "Metal"
+            data["gap_energy"] = 0.0
+        else:
+            data["gap_type"] = "Direct" if (data["VBM_kabc"] == data["CBM_kabc"]) else "Indirect"
+            data["gap_energy"] = round(data["CBM_energy"] - data["VBM_energy"], 10)
         return data
 
     def print_info(self):
@@ -2,20 +2,37 @@ from logging import info
 from rich import print
 from rich.panel import Panel
 
-def get_fermi_energy(outcar="./OUTCAR"):
+from hanetoolpy.utils.cache import get_stamp, load_cache, save_cache
+from hanetoolpy.utils.grep_get import grep_last
+
+def get_fermi_energy(outcar="./OUTCAR", cache=True):
     key_text = "E-fermi"
-    with open(outcar, 'r') as file:
-        info(f"Reading OUTCAR file \"{outcar}\" ...")
-        lines = file.readlines()
-    for line_number, line in enumerate(lines, start=1):
-        if key_text in line:
-            info("Find \"E-fermi\" line:")
-            text = f"{line_number} |" + line.replace("\n", "")
-            print(Panel(text))
-            e_fermi = float(line.split()[2])
+    if cache:
+        stamp = get_stamp(outcar)
+        data = load_cache(outcar, "fermi", stamp)
+        if data is not None:
+            e_fermi = float(data["e_fermi"])
+            info(f"Get Fermi energy from cache: E_F = {e_fermi} eV")
+            return e_fermi
+    info(f"Reading OUTCAR file \"{outcar}\" from the end ...")
+    line = grep_last(outcar, key_text)
+    if line is None:
+        raise ValueError(f"No \"{key_text}\" line found in {outcar}")
+    info("Find the last \"E-fermi\" line:")
+    print(Panel(line.rstrip("\r")))
+    e_fermi = float(line.split()[2])
     info(f"Get Fermi energy: E_F = {e_fermi} eV")
+    if cache:
+        save_cache(outcar, "fermi", stamp, e_fermi=e_fermi)
     return e_fermi
 
+
+def is_outcar_end(outcar="./OUTCAR", max_bytes=16384):
+    """
+    检查 OUTCAR 末尾是否有 "Total CPU time used"，只读取文件末尾 max_bytes 字节
+    """
+    return grep_last(outcar, "Total CPU time used", max_bytes=max_bytes) is not None
+
 if __name__ == '__main__':
     import logging
     logging.basicConfig(level=logging.INFO,